@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import os, json
+import utils
+
+
+# AliasIndex links names and ips as a bipartite graph and tracks its connected components
+# with union-find, so all names sharing an ip (directly or through other names) are one lookup away.
+# Nodes are stored as "n:<name>" and "i:<ip>" so both kinds can share one table.
+# Components are saved as a whole now and then, and links that changed them are appended to a log in between.
+class AliasIndex:
+	def __init__(self):
+		self.parent = {}
+		self.names = {} # Root node -> names in component
+		self.size = {} # Root node -> node count in component
+
+		self.pending = [] # Links that changed the components since they were last saved or logged
+		self.signature = None # Signature last saved or logged
+
+	# Link a name to an ip. Without an ip the name is only registered.
+	def add(self, name, ip=None):
+		nameNode = u'n:' + name
+		changed = self._addNode(nameNode, name)
+		if ip is not None:
+			ipNode = u'i:' + ip
+			changed = self._addNode(ipNode) or changed
+			changed = self._union(nameNode, ipNode) or changed
+		if changed:
+			self.pending.append([name, ip])
+
+	# Return all names in the same component as name, excluding name
+	def getAlias(self, name):
+		node = u'n:' + name
+		if node not in self.parent:
+			return []
+		return [n for n in self.names[self._find(node)] if n != name]
+
+	# Return every component as a list of nodes
+	def components(self):
+		components = {}
+		for node in self.parent:
+			components.setdefault(self._find(node), []).append(node)
+		return components.values()
+
+
+	# Load components from file, then the links logged since. Returns False if the files are missing or stale.
+	def load(self, filePath, logPath, signature):
+		if os.path.exists(filePath) and os.path.getsize(filePath) > 0:
+			with open(filePath, 'r') as file:
+				package = json.loads(file.read())
+
+			self.signature = package['signature']
+			for component in package['components']:
+				root = component[0]
+				for node in component:
+					self.parent[node] = root
+				self.names[root] = [node[2:] for node in component if node.startswith(u'n:')]
+				self.size[root] = len(component)
+
+		# A log written before an interrupted save ends with an old signature, so it is found stale
+		for entry in utils.readJsonLines(logPath):
+			if isinstance(entry, dict):
+				self.signature = entry['signature']
+			else:
+				self.add(*entry)
+		self.pending = []
+
+		return self.signature is not None and self.signature == signature
+
+	# Save components to file, tagged with a signature of the data they were built from, and empty the log
+	def save(self, filePath, logPath, signature):
+		package = {
+			'signature': signature,
+			'components': self.components()
+		}
+		package = json.dumps(package, ensure_ascii=False)
+		utils.writeAtomic(filePath, package.encode('utf-8'))
+		utils.truncate(logPath)
+
+		self.pending = []
+		self.signature = signature
+
+	# Append links added since the last save to the log, followed by the signature of the data they came from
+	def appendLog(self, logPath, signature):
+		if not self.pending and signature == self.signature:
+			return
+		utils.appendJsonLines(logPath, self.pending + [{'signature': signature}])
+
+		self.pending = []
+		self.signature = signature
+
+
+	# Add node if it's new, returning whether it was
+	def _addNode(self, node, name=None):
+		if node in self.parent:
+			return False
+		self.parent[node] = node
+		self.names[node] = [name] if name is not None else []
+		self.size[node] = 1
+		return True
+
+	# Find root of node, compressing the path on the way
+	def _find(self, node):
+		root = node
+		while self.parent[root] != root:
+			root = self.parent[root]
+		while self.parent[node] != root:
+			self.parent[node], node = root, self.parent[node]
+		return root
+
+	# Merge the components of a and b, smaller into larger. Returns False if they were already one.
+	def _union(self, a, b):
+		a, b = self._find(a), self._find(b)
+		if a == b:
+			return False
+		if self.size[a] < self.size[b]:
+			a, b = b, a
+
+		self.parent[b] = a
+		self.size[a] += self.size.pop(b)
+		self.names[a].extend(self.names.pop(b))
+		return True
@@ -1,28 +1,33 @@
-import sys, os
+import sys, os, time, itertools, collections
+from multiprocessing import Pool, cpu_count
 
 from database import Database
+import utils
+import config
 
 
-if len(sys.argv) != 2:
-	print 'python archiveReader.py <archive-file>'
-	exit()
+chunkSize = 20000 # Archive lines per worker task
+maxPending = cpu_count() * 2 # Chunks parsed ahead of the merge, bounds memory use
 
-filename = sys.argv[1]
 
-if not os.path.exists(filename) or os.path.getsize(filename) == 0:
-	print 'python archiveReader.py <archive-file>'
-	exit()
+# Parse archive lines into posts ordered by date. Malformed lines are skipped and counted.
+def parseChunk(lines):
+	posts = []
+	invalid = 0
 
-
-posts = []
-
-with open(filename, 'r') as f:
-	for line in f.read().decode('utf8').splitlines():
-		data = line.split('\t')[1:]
+	for line in lines:
+		data = line.decode('utf8').rstrip('\r\n').split('\t')[1:]
+		if len(data) < 5:
+			invalid += 1
+			continue
 
 		post = {}
 
-		post['date'] = data[0]
+		try:
+			post['date'] = utils.parseDate(data[0])
+		except (ValueError, IndexError):
+			invalid += 1
+			continue
 		post['name'] = data[1]
 		post['email'] = data[2]
 		post['ip'] = data[3]
@@ -30,5 +35,60 @@ with open(filename, 'r') as f:
 
 		posts.append(post)
 
-db = Database()
-db.updatePosts(posts)
+	posts.sort(key=lambda post: post['date'])
+	return posts, len(lines), invalid
+
+# Yield lists of up to chunkSize lines from file
+def readChunks(file):
+	while True:
+		lines = list(itertools.islice(file, chunkSize))
+		if not lines:
+			return
+		yield lines
+
+# Parse chunks on a process pool, yielding parsed chunks in file order.
+# Only maxPending chunks are read ahead, so memory use doesn't grow with the archive size.
+def parseArchive(file, pool):
+	stats = {'lines': 0, 'invalid': 0, 'posts': 0}
+	startTime = time.time()
+	pending = collections.deque()
+	chunks = readChunks(file)
+
+	for lines in itertools.chain(chunks, [None]):
+		if lines is not None:
+			pending.append(pool.apply_async(parseChunk, (lines,)))
+			if len(pending) < maxPending:
+				continue
+
+		while pending and (lines is None or len(pending) >= maxPending):
+			posts, lineCount, invalid = pending.popleft().get()
+			stats['lines'] += lineCount
+			stats['invalid'] += invalid
+			stats['posts'] += len(posts)
+
+			elapsed = time.time() - startTime
+			print 'Parsed {} lines ({:.0f} lines/s, {} invalid)'.format(stats['lines'], stats['lines'] / max(elapsed, 1e-6), stats['invalid'])
+			yield posts
+
+
+if __name__ == '__main__':
+	if len(sys.argv) != 2:
+		print 'python archiveReader.py <archive-file>'
+		exit()
+
+	filename = sys.argv[1]
+
+	if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+		print 'python archiveReader.py <archive-file>'
+		exit()
+
+	db = Database()
+	pool = Pool()
+	startTime = time.time()
+
+	with open(filename, 'r') as f:
+		db.mergePosts(parseArchive(f, pool), config.DB_POSTS_IMPORT_COMPACT_LIMIT)
+
+	pool.close()
+	pool.join()
+	print 'Import complete in {:.1f} seconds'.format(time.time() - startTime)
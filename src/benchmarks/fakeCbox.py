@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+# A local stand-in for cbox.ws, for running the bot end to end without the real site.
+# It serves the chat archive and submit endpoints, the login form and the control panel lists,
+# while replaying a recorded or synthetic chat at a given message rate.
+# Run from src/: python -m benchmarks.fakeCbox [--port 8080] [--rate 1] [--archive file]
+
+import sys, time, cgi, random, threading, itertools, argparse, collections
+import BaseHTTPServer, SocketServer, urlparse, Cookie
+
+from benchmarks import generator
+
+
+# Yield chat messages (dicts with name, email, ip and content) from an archive file, as archiveReader reads it.
+# Messages are replayed oldest first, whichever order the archive lists them in.
+def readArchive(filePath):
+	with open(filePath, 'r') as file:
+		lines = file.read().decode('utf8').splitlines()
+	lines.sort(key=lambda line: int(line.split('\t', 1)[0]))
+
+	for line in lines:
+		data = line.split('\t')[1:]
+		if len(data) < 5:
+			continue
+		yield {'name': data[1], 'email': data[2], 'ip': data[3], 'content': data[4]}
+
+# Yield synthetic chat messages without end
+def syntheticChat(seed=0):
+	users = generator.generateUsers(200, seed)
+	return generator.generatePosts(sys.maxint, users, seed)
+
+
+# FakeCbox is the stand-in server. Messages are numbered from 1 and kept oldest first.
+class FakeCbox(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	pageSize = 50 # Messages per archive response
+	rowsPerPage = 100 # Rows per control panel page
+
+	def __init__(self, port=0, source=None, rate=1.0, history=1000, loginInfo=None):
+		BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), FakeCboxHandler)
+		self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+		self.source = source # Iterator of messages to replay
+		self.rate = rate # Replayed messages per second
+		self.history = history # Messages available from the archive endpoint
+		self.loginInfo = loginInfo or {'username': 'admin@mail.com', 'password': 'password'}
+
+		self.lock = threading.Lock()
+		self.messages = []
+		self.sessions = set()
+		self.stats = collections.Counter() # Requests per endpoint
+		self.onSubmit = None # Called with (name, text, time) for every message posted to the chat
+
+		self.stopping = threading.Event()
+		self.threads = []
+
+	# Add a message to the chat, returning it
+	def addMessage(self, name, content, ip='127.0.0.1', email='', level=1):
+		with self.lock:
+			message = {
+				'id': len(self.messages) + 1,
+				'time': time.time(),
+				'name': name,
+				'content': content,
+				'ip': ip,
+				'email': email,
+				'level': level
+			}
+			self.messages.append(message)
+		return message
+
+	# Count a request to an endpoint
+	def count(self, endpoint):
+		with self.lock:
+			self.stats[endpoint] += 1
+
+	# Serve requests and replay the chat, each on a thread of its own
+	def start(self):
+		self.threads = [threading.Thread(target=self.serve_forever, name="fake-cbox")]
+		if self.source and self.rate > 0:
+			self.threads.append(threading.Thread(target=self._replay, name="fake-cbox-replay"))
+		for thread in self.threads:
+			thread.daemon = True
+			thread.start()
+
+	def stop(self):
+		self.stopping.set()
+		self.shutdown()
+		for thread in self.threads:
+			thread.join()
+		self.server_close()
+
+	# Return the archive response for messages after msgId: the header line,
+	# then up to pageSize of the oldest available messages after it, newest first
+	def archive(self, msgId):
+		with self.lock:
+			start = max(msgId, len(self.messages) - self.history, 0)
+			page = self.messages[start:start + self.pageSize]
+
+		lines = [u'0\t{}'.format(int(time.time()))]
+		for message in reversed(page):
+			lines.append(u'\t'.join([
+				unicode(message['id']),
+				unicode(int(message['time'])),
+				u'{}, {}'.format(generator.formatCboxDate(int(message['time'])), time.strftime('%a', time.gmtime(message['time']))),
+				message['name'],
+				unicode(message['level']),
+				message['email'],
+				cgi.escape(message['content']),
+				u'',
+				u'0',
+				unicode(message['id']),
+				u'',
+				u'',
+			]))
+		return u'\n'.join(lines)
+
+	# Post a message from the bot, returning the submit response
+	def submit(self, name, text):
+		message = self.addMessage(name, text, level=5)
+		if self.onSubmit:
+			self.onSubmit(name, text, message['time'])
+		return u'[{}]'.format(u'\t'.join([u'', u'', unicode(int(message['time'])), u'token', u'8', unicode(message['id']), u'']))
+
+	# Return the rows of a control panel list, newest first
+	def listRows(self, name):
+		with self.lock:
+			messages = list(self.messages)
+
+		if name == 'posts':
+			return [
+				u'<tr><td>{}</td><td><b>{}</b> {} <span>{}</span></td><td>{}<br>\n{}</td></tr>'.format(
+					message['id'], cgi.escape(message['name']), cgi.escape(message['email']), cgi.escape(message['content']),
+					generator.formatCboxDate(int(message['time'])), message['ip'])
+				for message in reversed(messages)]
+
+		if name == 'users':
+			users = collections.OrderedDict()
+			for message in messages:
+				user = users.setdefault(message['name'], {'registered': message['time']})
+				user['last used'] = message['time']
+				user['ip'] = message['ip']
+			return [
+				u'<tr><td>{}</td><td>{}</td><td></td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+					i, cgi.escape(name), generator.formatCboxDate(int(user['registered'])),
+					generator.formatCboxDate(int(user['last used'])), user['ip'])
+				for i, (name, user) in enumerate(reversed(users.items()))]
+
+		return [u'<tr><td colspan="6">No bans found</td></tr>']
+
+	# Return the html of one page of a control panel list
+	def listPage(self, name, page):
+		rows = self.listRows(name)
+		pageCount = max(1, (len(rows) + self.rowsPerPage - 1) // self.rowsPerPage)
+		pages = u'[1]' if pageCount == 1 else u' '.join(unicode(p) for p in range(1, pageCount+1))
+		rows = rows[(page-1) * self.rowsPerPage:page * self.rowsPerPage]
+		return (
+			u'<html><head><meta charset="utf-8"><title>Cbox</title></head><body>\n'
+			u'<div align="right">Page: {}</div>\n'
+			u'<table>\n<tr><th>#</th><th>{}</th></tr>\n{}\n</table>\n'
+			u'</body></html>'
+		).format(pages, name, u'\n'.join(rows))
+
+	# Replay the source at the message rate until stopped
+	def _replay(self):
+		startTime = time.time()
+		for i, message in enumerate(self.source):
+			delay = startTime + i / self.rate - time.time()
+			if delay > 0 and self.stopping.wait(delay):
+				return
+			if self.stopping.is_set():
+				return
+			self.addMessage(message['name'], message['content'], message['ip'], message['email'])
+
+
+# FakeCboxHandler answers one request to the fake server.
+class FakeCboxHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1' # Keep connections open, like the real site
+
+	loginPage = (
+		u'<html><body><form method="post" action="/login">'
+		u'<input type="text" name="uname"><input type="password" name="pword">'
+		u'<input type="submit" value="Log in"></form></body></html>')
+
+	def do_GET(self):
+		url = urlparse.urlparse(self.path)
+		query = dict(urlparse.parse_qsl(url.query))
+
+		if url.path == '/box/' and query.get('sec') == 'archive':
+			self.server.count('archive')
+			self._respond(self.server.archive(int(query.get('i', 0))))
+		elif url.path == '/':
+			self.server.count('login page')
+			self._respond(self.loginPage)
+		elif url.path in ['/admin_l_users', '/admin_l_posts', '/admin_l_bans']:
+			name = url.path.split('_')[-1]
+			self.server.count(name + ' page')
+			if self._session() not in self.server.sessions:
+				self._respond(u'Your session has expired.')
+			else:
+				self._respond(self.server.listPage(name, int(query.get('pg', 1))))
+		else:
+			self._respond(u'Not found', 404)
+
+	def do_POST(self):
+		url = urlparse.urlparse(self.path)
+		query = dict(urlparse.parse_qsl(url.query))
+		body = self.rfile.read(int(self.headers.getheader('Content-Length') or 0))
+		fields = dict(urlparse.parse_qsl(body))
+
+		if url.path == '/box/' and query.get('sec') == 'submit':
+			self.server.count('submit')
+			self._respond(self.server.submit(fields.get('nme', '').decode('utf-8'), fields.get('pst', '').decode('utf-8')))
+		elif url.path == '/login':
+			self.server.count('login')
+			loginInfo = self.server.loginInfo
+			if fields.get('uname') != loginInfo['username'] or fields.get('pword') != loginInfo['password']:
+				self._respond(u'Incorrect username or password.')
+				return
+			session = '%016x' % random.getrandbits(64)
+			self.server.sessions.add(session)
+			self._respond(u'<html><body>Logged in</body></html>', cookie='session=' + session)
+		else:
+			self._respond(u'Not found', 404)
+
+	def log_message(self, format, *args):
+		pass
+
+	def _session(self):
+		cookie = Cookie.SimpleCookie(self.headers.getheader('Cookie') or '')
+		return cookie['session'].value if 'session' in cookie else None
+
+	def _respond(self, body, code=200, cookie=None):
+		body = body.encode('utf-8')
+		self.send_response(code)
+		self.send_header('Content-Type', 'text/html; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		if cookie:
+			self.send_header('Set-Cookie', cookie + '; Path=/')
+		self.end_headers()
+		self.wfile.write(body)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Serve a fake Cbox with a replayed chat.')
+	parser.add_argument('--port', type=int, default=8080)
+	parser.add_argument('--rate', type=float, default=1.0, help='replayed messages per second')
+	parser.add_argument('--archive', help='chat archive to replay, synthetic chat by default')
+	args = parser.parse_args()
+
+	source = itertools.cycle(list(readArchive(args.archive))) if args.archive else syntheticChat()
+	server = FakeCbox(args.port, source, args.rate)
+	server.start()
+	print 'Fake Cbox running. Point the bot at it with:'
+	print '  CBOX_SITE_URL = "{}"'.format(server.url)
+	print '  CBOX_BOX_URL = "{}/box/"'.format(server.url)
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		pass
+	server.stop()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+# Deterministic synthetic Cbox data: users, ips, posts, archive files and chat lines.
+# The same size and seed always give the same data.
+
+import os, random, json
+
+from database import User
+import utils
+
+
+startDate = utils.parseDate('2014-01-01') # Date of the first generated post
+postInterval = 60 # Average seconds between posts
+
+contents = [
+	u'hello there',
+	u'!alias Golen',
+	u'<b>bold</b> and <i>italic</i> text',
+	u'Tom &amp; Jerry say &quot;hi&quot; &#9731;',
+	u'Åsa säger hej',
+	u'look: <a href="http://example.com">http://example.com</a> <img src="x.png" alt=":)">',
+]
+
+months = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
+
+
+# Return the number of users for a history of postCount posts
+def userCount(postCount):
+	return max(10, postCount // 50)
+
+# Return count user dicts as listed by the control panel.
+# Users have one to three ips, and some ips are shared, so users form alias groups.
+def generateUsers(count, seed=0):
+	rand = random.Random(seed)
+	users = []
+	for i in range(count):
+		ips = set()
+		for j in range(rand.choice([1, 1, 1, 2, 3])):
+			ips.add(u'10.%d.%d.%d' % (rand.randint(0, 3), rand.randint(0, 255), rand.randint(0, 255)))
+		users.append({
+			'name': u'user%d' % i,
+			'roles': [u'Mod'] if i % 100 == 0 else [],
+			'token': u'',
+			'registered': formatCboxDate(startDate + i * 60),
+			'last used': formatCboxDate(startDate + i * 60 + rand.randint(0, 10**7)),
+			'ip': sorted(ips)[0],
+			'ips': sorted(ips),
+		})
+	return users
+
+# Yield count post dicts, oldest first, as listed by the control panel.
+# A few users write most of the posts.
+def generatePosts(count, users, seed=0, start=startDate):
+	rand = random.Random(seed)
+	date = start
+	for i in xrange(count):
+		date += rand.randint(0, 2 * postInterval)
+		user = users[int(len(users) * rand.random() ** 3)]
+		yield {
+			'date': formatCboxDate(date),
+			'name': user['name'],
+			'email': u'' if i % 5 else u'%s@example.com' % user['name'],
+			'ip': rand.choice(user['ips']),
+			'content': u'%s %d' % (rand.choice(contents), i),
+		}
+
+# Return count chat lines, already split on tabs, as read from the chat archive
+def generateChatLines(count, seed=0):
+	rand = random.Random(seed)
+	lines = []
+	for i in range(count):
+		lines.append([
+			unicode(1000 + i),
+			unicode(1500000000 + i),
+			u'18 Apr 18 12:%02d:%02d, Wed' % (i // 60 % 60, i % 60),
+			u'user%d' % rand.randint(0, 200),
+			unicode(rand.randint(1, 4)),
+			u'',
+			rand.choice(contents),
+			u'',
+			u'0',
+			unicode(rand.randint(1, 9999)),
+			u'',
+			u'',
+		])
+	return lines
+
+# Return a timestamp as a Cbox date, "DD Mon YY HH:MM:SS"
+def formatCboxDate(timestamp):
+	date = utils.formatDate(timestamp)
+	y, m, d = date[:10].split('-')
+	return '%s %s %s %s' % (d, months[int(m)-1], y[2:], date[11:])
+
+
+# Write a posts database of postCount posts to dbPath, as the file backend stores it.
+# Post counters and ips are filled in, so loading it doesn't need to recount.
+def writeDatabase(dbPath, postCount, seed=0):
+	if not os.path.exists(dbPath):
+		os.makedirs(dbPath)
+
+	users = generateUsers(userCount(postCount), seed)
+	records = {}
+	for data in users:
+		user = User(data)
+		user.ip = set(data['ips'])
+		records[user.name] = user
+
+	with open(os.path.join(dbPath, 'posts.txt'), 'w') as file:
+		for data in generatePosts(postCount, users, seed):
+			date = utils.parseDate(data['date'])
+			line = u'\t'.join([utils.formatDate(date), data['name'], data['content'], data['ip'], data['email']])
+			file.write(line.encode('utf-8') + '\n')
+			records[data['name']].countPost(date)
+
+	with open(os.path.join(dbPath, 'users.json'), 'w') as file:
+		package = json.dumps([records[name].pack() for name in sorted(records)], ensure_ascii=False, indent=1)
+		file.write(package.encode('utf-8'))
+
+# Write a chat archive of postCount posts to filePath, as archiveReader reads it.
+# Posts are written oldest first, so the archive doesn't have to be held in memory.
+def writeArchive(filePath, postCount, seed=0):
+	users = generateUsers(userCount(postCount), seed)
+
+	with open(filePath, 'w') as file:
+		for i, post in enumerate(generatePosts(postCount, users, seed)):
+			line = u'\t'.join([unicode(i+1), post['date'], post['name'], post['email'], post['ip'], post['content']])
+			file.write(line.encode('utf-8') + '\n')
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+# Runs the bot against the fake Cbox server and measures how long commands take to be answered,
+# from the moment a command appears in the chat until the bot's response is posted.
+# The bot keeps its database in a temporary directory, and its output goes to a log file there.
+# Run from src/: python -m benchmarks.loadTest [--duration 60] [--rate 5] [--command-rate 0.5] [--archive file]
+
+import os, sys, re, time, json, tempfile, threading, itertools, argparse
+
+from benchmarks.fakeCbox import FakeCbox, readArchive, syntheticChat
+from cbox import Cbox
+
+
+boxInfo = {'srv': 0, 'id': 1, 'tag': 'LOADTEST'}
+botInfo = {'name': 'LoadBot', 'token': 'token', 'url': ''}
+loginInfo = {'username': 'admin@mail.com', 'password': 'password'}
+
+testers = 50 # Users taking turns issuing commands, so per-user cooldowns don't drop them
+
+
+# Return the value at fraction (0 to 1) of sorted values
+def percentile(values, fraction):
+	return values[int(round(fraction * (len(values)-1)))]
+
+# Return a summary of latency percentiles in milliseconds
+def summarize(latencies):
+	if not latencies:
+		return 'no commands answered'
+	latencies = sorted(latencies)
+	return 'p50 {:.0f} ms, p90 {:.0f} ms, p99 {:.0f} ms, max {:.0f} ms'.format(
+		*[percentile(latencies, f) * 1000 for f in [0.5, 0.9, 0.99, 1.0]])
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Measure command latency of the bot against a fake Cbox.')
+	parser.add_argument('--duration', type=float, default=60, help='seconds to issue commands for')
+	parser.add_argument('--rate', type=float, default=5, help='replayed chat messages per second')
+	parser.add_argument('--command-rate', type=float, default=0.5, help='commands per second')
+	parser.add_argument('--archive', help='chat archive to replay, synthetic chat by default')
+	parser.add_argument('--output', help='file to write the results to as JSON')
+	args = parser.parse_args()
+	archivePath = os.path.abspath(args.archive) if args.archive else None
+	outputPath = os.path.abspath(args.output) if args.output else None
+
+	workPath = tempfile.mkdtemp(prefix='cbox-load-')
+	os.chdir(workPath)
+
+	source = itertools.cycle(list(readArchive(archivePath))) if archivePath else syntheticChat()
+	server = FakeCbox(0, source, args.rate, loginInfo=loginInfo)
+	bot = Cbox(boxInfo, botInfo, loginInfo, siteUrl=server.url, boxUrl=server.url + '/box/')
+
+	issued = {} # Command token -> time it was posted
+	latencies = {} # Command token -> seconds until answered
+	lock = threading.Lock()
+
+	@bot.method("!echo (\d+)")
+	def echo(message, token):
+		return "echo %s" % token
+
+	def onSubmit(name, text, when):
+		match = re.match(r'echo (\d+)$', text)
+		with lock:
+			if match and match.group(1) in issued:
+				latencies[match.group(1)] = when - issued[match.group(1)]
+	server.onSubmit = onSubmit
+
+	stdout = sys.stdout
+	logPath = os.path.join(workPath, 'bot.log')
+	print 'Fake Cbox at {}, bot log in {}'.format(server.url, logPath)
+	sys.stdout = open(logPath, 'w', 0)
+
+	try:
+		server.start()
+		bot.start()
+
+		# Commands only count once the bot has found the latest message and is polling
+		while bot.lastChatId is None:
+			time.sleep(0.1)
+
+		startTime = time.time()
+		for i in itertools.count():
+			delay = startTime + i / args.command_rate - time.time()
+			if delay > 0:
+				time.sleep(delay)
+			if time.time() - startTime >= args.duration:
+				break
+			with lock:
+				message = server.addMessage('tester%d' % (i % testers), '!echo %d' % i)
+				issued[str(i)] = message['time']
+
+		# Give the last commands time to be answered
+		waitUntil = time.time() + 30
+		while len(latencies) < len(issued) and time.time() < waitUntil:
+			time.sleep(0.5)
+
+		bot.stop()
+		server.stop()
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+
+	results = {
+		'duration': args.duration,
+		'message rate': args.rate,
+		'command rate': args.command_rate,
+		'commands': len(issued),
+		'answered': len(latencies),
+		'latencies': sorted(latencies.values()),
+		'requests': dict(server.stats),
+		'chat transport': bot.chatTransport.getStats(),
+	}
+
+	print 'Commands answered: {} of {}'.format(len(latencies), len(issued))
+	print 'Command latency:   {}'.format(summarize(latencies.values()))
+	print 'Requests:          {}'.format(', '.join('{} {}'.format(count, name) for name, count in sorted(server.stats.items())))
+	print 'Polls per second:  {:.2f}'.format(server.stats['archive'] / (time.time() - startTime))
+	if outputPath:
+		with open(outputPath, 'w') as file:
+			json.dump(results, file, indent=1)
+		print 'Results written to', outputPath
+
+
+if __name__ == '__main__':
+	main()
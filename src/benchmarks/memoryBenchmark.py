@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+# Compares the memory held by the posts database with the Post class it replaced.
+# Run from src/: python -m benchmarks.memoryBenchmark [posts]
+
+import sys, random
+
+from database import Post
+import utils
+
+
+# The previous Post, with a __dict__ per instance and its own copy of every string
+class LegacyPost:
+	def __init__(self, data=None):
+		self.date = None
+		self.name = None
+		self.content = None
+		self.ip = None
+		self.email = None
+
+		if data:
+			self.loadDict(data)
+
+	def unpack(self, data):
+		data = data.split('\t')
+		self.date = data[0]
+		self.name = data[1]
+		self.content = data[2]
+		self.ip = data[3]
+		self.email = data[4]
+
+	def loadDict(self, data):
+		self.date = utils.convertDate(data['date'])
+		self.name = data['name']
+		self.content = data['content']
+		self.ip = data['ip']
+		self.email = data['email']
+
+
+contents = [
+	u'hello there',
+	u'!alias Golen',
+	u'<b>bold</b> and <i>italic</i> text',
+	u'Tom &amp; Jerry say &quot;hi&quot; &#9731;',
+]
+
+# Return count synthetic packed posts, as read from the posts database
+def generatePacks(count, seed=0):
+	rand = random.Random(seed)
+	packs = []
+	for i in range(count):
+		user = rand.randint(0, 500)
+		packs.append(u'\t'.join([
+			u'2018-04-%02d %02d:%02d:%02d' % (1 + i // 86400 % 28, i // 3600 % 24, i // 60 % 60, i % 60),
+			u'user%d' % user,
+			u'%s %d' % (rand.choice(contents), i),
+			u'10.0.%d.%d' % (user % 7, user),
+			u'' if user % 3 else u'user%d@example.com' % user,
+		]))
+	return packs
+
+# Return bytes held by posts: the instances, their dicts and every distinct string they refer to
+def measureSize(posts):
+	size = sys.getsizeof(posts)
+	seen = set()
+	for post in posts:
+		size += sys.getsizeof(post)
+		if hasattr(post, '__dict__'):
+			size += sys.getsizeof(post.__dict__)
+		for value in (post.date, post.name, post.content, post.ip, post.email):
+			if id(value) not in seen:
+				seen.add(id(value))
+				size += sys.getsizeof(value)
+	return size
+
+# Return posts of class cls unpacked from packs
+def load(cls, packs):
+	posts = []
+	for pack in packs:
+		post = cls()
+		post.unpack(pack)
+		posts.append(post)
+	return posts
+
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+	packs = generatePacks(count)
+
+	legacy = measureSize(load(LegacyPost, packs))
+	compact = measureSize(load(Post, packs))
+	print 'Posts:         {}'.format(count)
+	print 'Legacy posts:  {:.1f} MB ({:.0f} bytes/post)'.format(legacy / 1e6, float(legacy) / count)
+	print 'Compact posts: {:.1f} MB ({:.0f} bytes/post)'.format(compact / 1e6, float(compact) / count)
+	print 'Saved:         {:.0f}%'.format(100 - 100.0 * compact / legacy)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+# Compares the chat line parser with the BeautifulSoup parser it replaced.
+# Run from src/: python -m benchmarks.parserBenchmark [lines]
+
+import sys, timeit
+from bs4 import BeautifulSoup
+
+from chatParser import CboxMessage, htmlToText
+from benchmarks.generator import generateChatLines, contents
+import utils
+
+
+# Message html the generated lines don't cover
+edgeCases = [
+	u'<img alt=">:(" src=x>hi',
+	u"<img alt='a > b' src=x>hi",
+	u'<a href="x">link</a> &amp; text'
+]
+
+
+# The previous CboxMessage, which parsed every field up front
+class LegacyMessage:
+	levels = ["normal", "registered", "moderator", "admin", "bot", "reserved"]
+
+	def __init__(self, data):
+		self.id = int(data[0])
+		self.time = int(data[1])
+		self.date = utils.convertDate(data[2].split(',')[0])
+		self.name = data[3]
+		self.level = self.levels[int(data[4])-1]
+		self.exturl = data[5]
+		self.content = BeautifulSoup(data[6], "html.parser").text
+		self.imgurl = data[7]
+		self.badFlags = int(data[8])
+		self.userid = data[9]
+		self.flaghtml = data[10]
+		self.localId = data[11]
+
+		self.isRedirected = bool(self.badFlags & 16)
+		self.isPrivate = bool(self.badFlags & 32)
+		self.isSticky = self.id == -1
+		self.isTemp = self.id == 0
+
+
+# Return seconds per line for parsing lines with cls and reading what the bot reads from every message
+def measure(cls, lines, repeat=3):
+	def run():
+		for data in lines:
+			message = cls(data)
+			message.id, message.time, message.name, message.content
+	return min(timeit.repeat(run, number=1, repeat=repeat)) / len(lines)
+
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+	lines = generateChatLines(count)
+
+	for data in lines[:len(contents)]:
+		assert CboxMessage(data).content == LegacyMessage(data).content, data[6]
+	for html in edgeCases:
+		assert htmlToText(html) == BeautifulSoup(html, "html.parser").text, html
+
+	legacy = measure(LegacyMessage, lines)
+	fast = measure(CboxMessage, lines)
+	print 'BeautifulSoup parser: {:.2f} us/line'.format(legacy * 1e6)
+	print 'Chat line parser:     {:.2f} us/line'.format(fast * 1e6)
+	print 'Speedup:              {:.1f}x'.format(legacy / fast)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+# Times the hot paths of the bot on synthetic data of growing size and records their peak memory.
+# Every benchmark runs in its own process, so peak memory is its own. Benchmarks that write get a copy of the data.
+# Results are written as JSON, and can be compared with the results of another commit.
+# Run from src/: python -m benchmarks.suite [--sizes 10000,100000] [--only load,getAlias] [--compare old.json]
+
+import os, sys, json, time, shutil, random, tempfile, resource, subprocess, argparse, collections
+
+from benchmarks import generator
+
+
+srcPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+benchmarks = collections.OrderedDict() # Name -> (function, whether it changes the database)
+
+# Register a benchmark. The function takes the post count and returns (setup, run):
+# setup prepares untimed state, run is timed and returns the number of operations it did.
+def benchmark(name, writes=False):
+	def decorator(func):
+		benchmarks[name] = (func, writes)
+		return func
+	return decorator
+
+
+#--- Benchmarks ---#
+# Run in a work directory holding the database in data/ and the archive in archive.txt
+
+def loadDatabase():
+	from database import Database
+	return Database()
+
+@benchmark('load')
+def benchLoad(size):
+	def setup():
+		pass
+	def run():
+		loadDatabase()
+		return 1
+	return setup, run
+
+@benchmark('updatePosts', writes=True)
+def benchUpdatePosts(size):
+	state = {}
+	def setup():
+		state['db'] = loadDatabase()
+		users = generator.generateUsers(generator.userCount(size))
+		start = state['db'].posts.newest().date
+		posts = list(generator.generatePosts(1000, users, seed=1, start=start+1))
+		posts.reverse() # The control panel lists the newest first
+		state['posts'] = posts
+	def run():
+		state['db'].updatePosts(state['posts'])
+		return len(state['posts'])
+	return setup, run
+
+@benchmark('updateUsers', writes=True)
+def benchUpdateUsers(size):
+	state = {}
+	def setup():
+		state['db'] = loadDatabase()
+		users = generator.generateUsers(generator.userCount(size) + 100, seed=1)
+		state['users'] = users[-1000:]
+	def run():
+		state['db'].updateUsers(state['users'])
+		return len(state['users'])
+	return setup, run
+
+@benchmark('getAlias')
+def benchGetAlias(size):
+	state = {}
+	def setup():
+		state['db'] = loadDatabase()
+		rand = random.Random(0)
+		state['names'] = [u'user%d' % rand.randint(0, generator.userCount(size)-1) for i in range(1000)]
+	def run():
+		for name in state['names']:
+			state['db'].getAlias(name)
+		return len(state['names'])
+	return setup, run
+
+@benchmark('getPostCountByUser')
+def benchGetPostCountByUser(size):
+	state = {}
+	def setup():
+		state['db'] = loadDatabase()
+		rand = random.Random(0)
+		state['names'] = [u'user%d' % rand.randint(0, generator.userCount(size)-1) for i in range(100000)]
+	def run():
+		for name in state['names']:
+			state['db'].getPostCountByUser(name)
+		return len(state['names'])
+	return setup, run
+
+@benchmark('parseChat')
+def benchParseChat(size):
+	from chatParser import CboxMessage
+	state = {}
+	def setup():
+		state['lines'] = generator.generateChatLines(min(size, 10**6))
+	def run():
+		for data in state['lines']:
+			message = CboxMessage(data)
+			message.id, message.time, message.name, message.content
+		return len(state['lines'])
+	return setup, run
+
+@benchmark('importArchive', writes=True)
+def benchImportArchive(size):
+	from multiprocessing import Pool
+	import archiveReader, config
+	state = {}
+	def setup():
+		shutil.rmtree('data')
+		state['db'] = loadDatabase()
+		state['pool'] = Pool()
+	def run():
+		with open('archive.txt', 'r') as file:
+			state['db'].mergePosts(archiveReader.parseArchive(file, state['pool']), config.DB_POSTS_IMPORT_COMPACT_LIMIT)
+		state['pool'].close()
+		state['pool'].join()
+		return size
+	return setup, run
+
+
+#--- Runner ---#
+
+# Return peak memory use of this process in kB
+def peakMemory():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# Run one benchmark in this process, in workPath, writing its result to resultPath
+def runChild(name, size, workPath, resultPath):
+	os.chdir(workPath)
+	func, writes = benchmarks[name]
+	setup, run = func(size)
+
+	setup()
+	setupPeak = peakMemory()
+	startTime = time.time()
+	operations = run()
+	elapsed = time.time() - startTime
+
+	with open(resultPath, 'w') as file:
+		json.dump({
+			'benchmark': name,
+			'size': size,
+			'seconds': elapsed,
+			'operations': operations,
+			'us per operation': elapsed / operations * 1e6,
+			'setup peak kB': setupPeak,
+			'peak kB': peakMemory()
+		}, file)
+
+# Run a child process of this module with args, hiding its output
+def spawn(args):
+	env = dict(os.environ)
+	env['PYTHONPATH'] = os.pathsep.join([srcPath] + filter(None, [env.get('PYTHONPATH')]))
+	with open(os.devnull, 'w') as devnull:
+		subprocess.check_call([sys.executable, '-m', 'benchmarks.suite'] + args, env=env, stdout=devnull)
+
+# Return the directory holding the data for size, generating it the first time
+def prepareData(dataPath, size):
+	sizePath = os.path.join(dataPath, 'size-{}'.format(size))
+	if os.path.exists(os.path.join(sizePath, 'ready')):
+		return sizePath
+
+	print 'Generating {} posts...'.format(size)
+	if os.path.exists(sizePath):
+		shutil.rmtree(sizePath)
+	generator.writeDatabase(os.path.join(sizePath, 'data'), size)
+	generator.writeArchive(os.path.join(sizePath, 'archive.txt'), size)
+	# Loading once builds the post index, post hashes and alias index
+	spawn(['--prime', sizePath])
+
+	open(os.path.join(sizePath, 'ready'), 'w').close()
+	return sizePath
+
+# Run a benchmark on the data in sizePath, in a process of its own. Returns its result.
+def runBenchmark(name, size, sizePath):
+	func, writes = benchmarks[name]
+	workPath = sizePath
+	resultFile, resultPath = tempfile.mkstemp(suffix='.json')
+	os.close(resultFile)
+
+	try:
+		if writes:
+			workPath = tempfile.mkdtemp(prefix='cbox-bench-')
+			shutil.copytree(os.path.join(sizePath, 'data'), os.path.join(workPath, 'data'))
+			os.symlink(os.path.join(sizePath, 'archive.txt'), os.path.join(workPath, 'archive.txt'))
+		spawn(['--child', name, str(size), workPath, resultPath])
+		with open(resultPath, 'r') as file:
+			return json.load(file)
+	finally:
+		os.remove(resultPath)
+		if writes:
+			shutil.rmtree(workPath)
+
+# Return the current git commit, or None outside a git checkout
+def gitCommit():
+	try:
+		with open(os.devnull, 'w') as devnull:
+			return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=srcPath, stderr=devnull).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+# Print the change of every result from the matching result in a previous run
+def compare(results, previous):
+	old = {(result['benchmark'], result['size']): result for result in previous['results']}
+	print
+	print 'Compared with {}:'.format(previous.get('commit'))
+	for result in results:
+		before = old.get((result['benchmark'], result['size']))
+		if not before:
+			continue
+		print '{:<20} {:>9} {:>7.2f}x time {:>7.2f}x peak memory'.format(result['benchmark'], result['size'],
+			result['seconds'] / max(before['seconds'], 1e-9), float(result['peak kB']) / before['peak kB'])
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark the bot on synthetic data.')
+	parser.add_argument('--sizes', default='10000,100000', help='comma-separated post counts, up to 10000000')
+	parser.add_argument('--only', help='comma-separated benchmarks to run: ' + ', '.join(benchmarks))
+	parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'cbox-bench'), help='where generated data is kept between runs')
+	parser.add_argument('--output', help='results file, benchmark-<commit>.json in the data directory by default')
+	parser.add_argument('--compare', help='results file of a previous run to compare with')
+	parser.add_argument('--child', nargs=4, help=argparse.SUPPRESS)
+	parser.add_argument('--prime', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.child:
+		name, size, workPath, resultPath = args.child
+		runChild(name, int(size), workPath, resultPath)
+		return
+	if args.prime:
+		os.chdir(args.prime)
+		loadDatabase()
+		return
+
+	sizes = [int(size) for size in args.sizes.split(',')]
+	names = args.only.split(',') if args.only else list(benchmarks)
+	for name in names:
+		if name not in benchmarks:
+			parser.error('Unknown benchmark "{}"'.format(name))
+
+	commit = gitCommit()
+	results = []
+	for size in sizes:
+		sizePath = prepareData(args.data, size)
+		for name in names:
+			result = runBenchmark(name, size, sizePath)
+			results.append(result)
+			print '{:<20} {:>9} {:>10.3f} s {:>10.2f} us/op {:>9} kB peak'.format(name, size,
+				result['seconds'], result['us per operation'], result['peak kB'])
+
+	output = args.output or os.path.join(args.data, 'benchmark-{}.json'.format(commit or 'local'))
+	with open(output, 'w') as file:
+		json.dump({
+			'commit': commit,
+			'python': sys.version.split()[0],
+			'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+			'results': results
+		}, file, indent=1)
+	print 'Results written to', output
+
+	if args.compare:
+		with open(args.compare, 'r') as file:
+			compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+	main()
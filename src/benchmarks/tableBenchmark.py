@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+# Compares the lxml table parser with the BeautifulSoup page parsers it replaced.
+# Run from src/: python -m benchmarks.tableBenchmark [rows]
+
+import sys, random, timeit
+from bs4 import BeautifulSoup
+
+import tableParser
+
+
+# The previous control panel parsers, which built the whole page with html.parser
+def legacyPageCount(html):
+	pageStr = html.find(align="right").text
+	digit = pageStr.strip().split()[-1]
+	if '[' in digit or '-' in digit:
+		return 1
+	return int(digit)
+
+def legacyUsers(data):
+	html = BeautifulSoup(data, "html.parser")
+	users = []
+	trs = html.findAll("tr")
+	for tri in range(1, len(trs)):
+		tds = trs[tri].findAll("td")
+		nameData = tds[1].contents
+		user = {}
+		user["name"] = nameData.pop().strip()
+		user["roles"] = [n.text[1:-1] for n in nameData[::2]]
+		user["token"] = tds[2].text
+		user["registered"] = tds[3].text.strip()
+		user["last used"] = tds[4].text.strip()
+		user["ip"] = tds[5].text.strip()
+		users.append(user)
+	return users, legacyPageCount(html)
+
+def legacyPosts(data):
+	html = BeautifulSoup(data, "html.parser")
+	posts = []
+	trs = html.findAll("tr")
+	for tri in range(1, len(trs)):
+		tds = trs[tri].findAll("td")
+		msgData = tds[1].contents
+		dateData = tds[2].text.splitlines()
+		post = {}
+		post["name"] = msgData[0].text
+		post["email"] = msgData[1].strip()
+		post["content"] = msgData[2].text
+		post["date"] = dateData[0]
+		post["ip"] = dateData[1]
+		posts.append(post)
+	return posts, legacyPageCount(html)
+
+def legacyBans(data):
+	html = BeautifulSoup(data, "html.parser")
+	bans = []
+	trs = html.findAll("tr")
+	for tri in range(1, len(trs)):
+		tds = trs[tri].findAll("td")
+		if "No bans found" in tds[0].text:
+			break
+		ban = {}
+		ban["name"] = tds[1].text.strip()
+		ban["reason"] = tds[2].text.strip()
+		ban["ip"] = tds[3].text.strip()
+		ban["date"] = tds[4].text.strip()
+		ban["expiry"] = tds[5].text.strip()
+		bans.append(ban)
+	return bans, legacyPageCount(html)
+
+
+contents = [
+	u'hello there',
+	u'<b>bold</b> and <i>italic</i> text',
+	u'Tom &amp; Jerry &#9731;',
+	u'Åsa säger hej',
+]
+
+# Return the html of a control panel page with the given rows
+def makePage(header, rows, pageCount, encoding='utf-8'):
+	return (
+		u'<html><head><meta charset="{}"><title>Cbox</title></head><body>\n'
+		u'<div align="right">Page: 1 2 3 ... {}</div>\n'
+		u'<table>\n<tr>{}</tr>\n{}\n</table>\n'
+		u'</body></html>'
+	).format(encoding, pageCount, u''.join(u'<th>{}</th>'.format(h) for h in header), u'\n'.join(rows)).encode(encoding)
+
+# Return the html of a synthetic posts page with count rows
+def generatePostsPage(count, seed=0):
+	rand = random.Random(seed)
+	rows = []
+	for i in range(count):
+		rows.append(
+			u'<tr><td>{}</td><td><b>user{}</b> user{}@example.com <span>{}</span></td>'
+			u'<td>18 Apr 18, 12:{:02d}<br>\n10.0.{}.{}</td></tr>'.format(
+				i, rand.randint(0, 200), i, rand.choice(contents), i % 60, rand.randint(0, 255), rand.randint(0, 255)))
+	return makePage([u'#', u'Message', u'Date'], rows, 12)
+
+def generateUsersPage(count, seed=0, encoding='utf-8'):
+	rand = random.Random(seed)
+	rows = []
+	for i in range(count):
+		roles = u' '.join(u'<b>[{}]</b>'.format(role) for role in rand.choice([[], [u'Mod'], [u'Admin', u'Mod']]))
+		rows.append(
+			u'<tr><td>{}</td><td>{} Ålf{}</td><td>tok{}</td><td> 18 Apr 18, 12:00 </td>'
+			u'<td> 19 Apr 18, 13:00 </td><td> 10.0.0.{} </td></tr>'.format(
+				i, roles, i, i, rand.randint(0, 255)))
+	return makePage([u'#', u'Name', u'Token', u'Registered', u'Last used', u'Ip'], rows, 3, encoding)
+
+def generateBansPage(count):
+	rows = [u'<tr><td>{}</td><td> user{} </td><td> spam </td><td> 10.0.0.{} </td><td> 18 Apr 18 </td><td> Never </td></tr>'.format(i, i, i) for i in range(count)]
+	return makePage([u'#', u'Name', u'Reason', u'Ip', u'Date', u'Expiry'], rows, 1)
+
+# Return seconds per page for parse(data)
+def measure(parse, data, repeat=3):
+	return min(timeit.repeat(lambda: parse(data), number=1, repeat=repeat))
+
+
+if __name__ == '__main__':
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+	checks = [
+		(legacyUsers, tableParser.USERS, generateUsersPage(50)),
+		(legacyPosts, tableParser.POSTS, generatePostsPage(50)),
+		(legacyBans, tableParser.BANS, generateBansPage(5)),
+		(legacyBans, tableParser.BANS, makePage([u'#'], [u'<tr><td colspan="6">No bans found</td></tr>'], 1)),
+	]
+	for legacy, schema, data in checks:
+		assert tableParser.parseTable(data, schema) == legacy(data)
+
+	# Charset from the response headers, and from the page when the headers have none
+	data = generateUsersPage(50, encoding='iso-8859-1')
+	assert tableParser.parseTable(data, tableParser.USERS, 'ISO-8859-1') == legacyUsers(data)
+	assert tableParser.parseTable(data, tableParser.USERS) == legacyUsers(data)
+
+	# Right-aligned cells in the table are not the page list
+	data = (
+		u'<html><body><table><tr><th>#</th></tr><tr><td>1</td><td>a</td><td>b</td><td>c</td><td>d</td><td align="right"> 5 </td></tr></table>'
+		u'<div align="right">Page: 1 2 ... 7</div></body></html>').encode('utf-8')
+	assert tableParser.parseTable(data, tableParser.BANS)[1] == 7
+
+	data = generatePostsPage(count)
+	legacy = measure(legacyPosts, data)
+	fast = measure(lambda data: tableParser.parseTable(data, tableParser.POSTS), data)
+	print 'Posts page of {} rows ({} kB)'.format(count, len(data) // 1024)
+	print 'BeautifulSoup parser: {:.1f} ms'.format(legacy * 1e3)
+	print 'lxml table parser:    {:.1f} ms'.format(fast * 1e3)
+	print 'Speedup:              {:.1f}x'.format(legacy / fast)
@@ -1,7 +1,8 @@
-import re, pprint
+import re, pprint, collections
 
-from utils import bold, italic, underline, strike, quote
+from utils import bold, italic, underline, strike, quote, parseDate, formatDate
 from cbox import Cbox
+from metrics import registry as metrics
 import config
 
 
@@ -27,6 +28,9 @@ def getAlias(message, name):
 	if not user:
 		if not name:
 			return "Sorry, I don't recognize that."
+		suggestions = cbox.db.suggestUserNames(name)
+		if suggestions:
+			return "Sorry, I don't recognize the name %s. Did you mean %s?" % (italic(name), ' or '.join(italic(s) for s in suggestions))
 		return "Sorry, I don't recognize the name %s." % (italic(name))
 
 	aliases = cbox.db.getAlias(user.name)
@@ -44,6 +48,57 @@ def getAlias(message, name):
 
 	return "%s is also known as: %s." % (user.name, ', '.join(aliases))
 
+@cbox.method("!seen (.*)")
+def seenUser(message, name):
+	user = cbox.db.findUserByName(name)
+	if not user:
+		return "Sorry, I don't recognize the name %s." % (italic(name))
+
+	post = cbox.db.getLastPost(user.name)
+	if not post:
+		return "Sorry, I haven't seen %s post anything." % (italic(user.name))
+
+	return "%s was last seen %s, saying: %s" % (user.name, formatDate(post.date), quote(post.content))
+
+@cbox.method("!activity (.*)")
+def getActivity(message, date):
+	try:
+		start = parseDate(date.strip())
+	except (ValueError, IndexError):
+		start = None
+	if start is None:
+		return "Sorry, I don't understand the date %s. Try YYYY-MM-DD." % (italic(date))
+
+	posts = cbox.db.getPostsBetween(start, start + 24*60*60)
+	if not posts:
+		return "Nobody posted on %s." % (formatDate(start).split()[0])
+
+	counts = collections.Counter(post.name for post in posts)
+	active = ['%s (%d)' % (italic(name), count) for name, count in counts.most_common(3)]
+	return "%d posts by %d users on %s. Most active: %s." % (len(posts), len(counts), formatDate(start).split()[0], ', '.join(active))
+
+@cbox.method("!stats")
+def getStats(message):
+	if message.level != 'admin':
+		return "Sorry, only admins can see my stats."
+
+	stats = metrics.snapshot()
+	def timing(name):
+		histogram = stats.get(name)
+		if not histogram or not histogram['count']:
+			return 'none yet'
+		return 'p50 %.0f ms, p99 %.0f ms' % (histogram['p50'] * 1000, histogram['p99'] * 1000)
+	def count(name):
+		return stats.get(name) or 0
+
+	uptime = int(stats['uptime'])
+	return "Up %dh %02dm. %d polls (%s, %d errors), %d messages. %d commands (%s, %d refused, %d failed). %d syncs (%s). Posted %d messages (%s)." % (
+		uptime // 3600, uptime // 60 % 60,
+		count('chat polls'), timing('chat poll time'), count('chat poll errors'), count('chat messages'),
+		count('commands'), timing('command time'), count('commands refused'), count('command errors'),
+		count('full syncs') + count('incremental syncs'), timing('sync time'),
+		count('chat posts'), timing('chat post time'))
+
 
 #--- Run bot ---#
 if __name__ == '__main__':
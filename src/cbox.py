@@ -2,71 +2,111 @@
 # Copyright (c) 2018, Måns Gezelius (Golen)
 # All rights reserved.
 
-import re, pycurl, io, json, traceback, time
+import os, pycurl, json, traceback, time, Queue
 import twill.commands as twill
-from bs4 import BeautifulSoup
 from urllib import urlencode
 
 from database import Database
+from pageFetcher import PageFetcher
+from transport import Transport
+from tasks import TaskGroup
+from dispatcher import Dispatcher
+from commandPool import Command, CommandPool
+from chatParser import CboxMessage
+import tableParser
+from scheduler import createScheduler
+from metrics import registry as metrics, countBounds
 import utils
+import config
 
 
 # CBox handles all communication with cbox.ws, reading and sending messages.
+# The site and box urls can be pointed elsewhere, such as at a local stand-in for testing.
 class Cbox:
-	def __init__(self, boxInfo, botInfo, loginInfo):
+	def __init__(self, boxInfo, botInfo, loginInfo, siteUrl=config.CBOX_SITE_URL, boxUrl=config.CBOX_BOX_URL):
 		self.boxInfo = boxInfo
 		self.botInfo = botInfo
 		self.loginInfo = loginInfo
+		self.siteUrl = siteUrl
+		self.boxUrl = boxUrl.format(srv=boxInfo['srv'])
 
 		self.db = None
-		
+		self.chatTransport = self._createTransport(config.HTTP_CHAT_TIMEOUT)
+		self.panelTransport = self._createTransport(config.HTTP_PANEL_TIMEOUT)
+		self.pageFetcher = PageFetcher(self.panelTransport, config.FETCH_WORKERS)
+
 		self.lastChatId = None
+		self.savedChatId = None
 
-		self.userMethods = []
+		self.dispatcher = Dispatcher(config.COMMAND_MATCH_MODE)
 
-		self.lastChatTime = time.time()
-		self.lastCommandTime = time.time()
+		self.scheduler = createScheduler(config.POLL_SCHEDULER)
+		self.lastChatFailed = False
 		self.lastFetchTime = 0
 		self.lastFetchMsgCount = 0
+		self.lastFullSyncTime = 0
 
+		self.tasks = None
+		self.inbox = Queue.Queue() # Incoming chat messages
+		self.outbox = Queue.Queue() # Outgoing chat messages
+		self.commandPool = CommandPool(config.COMMAND_WORKERS, config.COMMAND_QUEUE_SIZE, self.send)
 
-	# Parse html
-	def _toHtml(self, data):
-		return BeautifulSoup(data, "html.parser")
 
-	# Returns the max number of pages to check
-	def _findMaxPage(self, html):
-		pageStr = html.find(align="right").text
-		digit = pageStr.strip().split()[-1]
-		if '[' in digit or '-' in digit:
-			return 1
-		return int(digit)
+	def _createTransport(self, timeout):
+		return Transport(timeout, config.HTTP_CONNECT_TIMEOUT, config.HTTP_RETRIES, config.HTTP_BACKOFF, config.HTTP_DNS_CACHE_TIMEOUT)
 
-	# Return data from all available pages of a given url (posts, users, bans)
-	def _requestPages(self, url, page=1, expired=False):
-		twill.go("{}?pg={}".format(url, page))
-		#twill.go(url.replace(".html", "_{}.html".format(page)))
-		response = twill.browser.get_html()
+	# Return (rows, page count) for each url, fetched concurrently and parsed by schema
+	def _fetchPages(self, urls, schema):
+		metrics.counter('panel pages').inc(len(urls))
+		responses = self.pageFetcher.fetchAll(urls)
+		if any("Your session has expired." in response for response, charset in responses):
+			raise SessionExpired()
+		return [tableParser.parseTable(response, schema, charset) for response, charset in responses]
+
+	# Return rows from all available pages of a given url (posts, users, bans), read with schema.
+	# The first page tells how many pages there are, the rest are fetched concurrently.
+	# Given isKnown, paging stops at the first page where every row is already known,
+	# fetching pages in growing batches since most updates only need a page or two.
+	def _requestPages(self, url, schema, isKnown=None, expired=False):
+		with metrics.timer('panel request time'):
+			return self._requestAllPages(url, schema, isKnown, expired)
+
+	# Body of _requestPages, timed as a whole including a retry after logging in
+	def _requestAllPages(self, url, schema, isKnown, expired):
+		pageUrl = lambda page: "{}?pg={}".format(url, page)
 
-		if "Your session has expired." in response:
+		try:
+			rows, maxPage = self._fetchPages([pageUrl(1)], schema)[0]
+			pages = [rows]
+
+			page = 2
+			batch = 1 if isKnown else maxPage
+			while page <= maxPage and not (isKnown and all(isKnown(row) for row in pages[-1])):
+				urls = [pageUrl(p) for p in range(page, min(page+batch, maxPage+1))]
+				for rows, pageCount in self._fetchPages(urls, schema):
+					pages.append(rows)
+					if isKnown and all(isKnown(row) for row in pages[-1]):
+						break
+				page += len(urls)
+				batch = min(batch*2, self.pageFetcher.workers)
+
+		except SessionExpired:
 			if expired:
 				raise Exception("Unable to log into cbox! Your session has expired.")
 			self.login()
-			return self._requestPages(url, page, True)
-
-		if page == 1:
-			html = self._toHtml(response)
-			maxPage = self._findMaxPage(html)
-			return [html] + [self._requestPages(url, page+i, expired) for i in range(1,maxPage)]
+			return self._requestAllPages(url, schema, isKnown, True)
 
-		return self._toHtml(response)
+		if isKnown:
+			print "Fetched {} of {} pages".format(len(pages), maxPage)
+		return [row for rows in pages for row in rows]
 
 
 	#-- Cbox control panel lists --#
 
 	def login(self):
 		print "Logging in..."
-		twill.go("https://www.cbox.ws")
+		metrics.counter('panel logins').inc()
+		twill.go(self.siteUrl)
 
 		twill.formclear("1")
 		twill.fv("1", "uname", self.loginInfo["username"])
@@ -78,108 +118,102 @@ class Cbox:
 		if "Incorrect username or password." in response:
 			raise Exception("Unable to log into cbox! Incorrect username or password.")
 
+		# Share the logged-in session with the page fetcher
+		self.pageFetcher.setCookies(twill.browser.cj)
+
 	# Return list of users from cbox control panel
-	def fetchUsers(self):
+	# If incremental, stop at the first page of users already up to date in the database.
+	def fetchUsers(self, incremental=False):
 		print "Getting users..."
-		pages = self._requestPages("https://www.cbox.ws/admin_l_users")
-
-		users = []
-
-		for html in pages:
-			trs = html.findAll("tr")
-			for tri in range(1, len(trs)):
-				tds = trs[tri].findAll("td")
-				nameData = tds[1].contents
-
-				user = {}
-
-				user["name"] = nameData.pop().strip()
-				user["roles"] = [n.text[1:-1] for n in nameData[::2]]
-				user["token"] = tds[2].text
-				user["registered"] = tds[3].text.strip()
-				user["last used"] = tds[4].text.strip()
-				user["ip"] = tds[5].text.strip()
-
-				users.append(user)
-
-		return users
+		isKnown = self.db.isKnownUser if incremental else None
+		return self._requestPages(self.siteUrl + "/admin_l_users", tableParser.USERS, isKnown)
 
 	# Return list of messages from cbox control panel
-	def fetchPosts(self):
+	# If incremental, stop at the first page of posts already in the database.
+	def fetchPosts(self, incremental=False):
 		print "Getting posts..."
-		pages = self._requestPages("https://www.cbox.ws/admin_l_posts")
-
-		posts = []
-
-		for html in pages:
-			trs = html.findAll("tr")
-			for tri in range(1, len(trs)):
-				tds = trs[tri].findAll("td")
-				msgData = tds[1].contents
-				dateData = tds[2].text.splitlines()
-
-				post = {}
-
-				post["name"] = msgData[0].text
-				post["email"] = msgData[1].strip()
-				post["content"] = msgData[2].text
-				post["date"] = dateData[0]
-				post["ip"] = dateData[1]
-
-				posts.append(post)
-
-		return posts
+		isKnown = self.db.isKnownPost if incremental else None
+		return self._requestPages(self.siteUrl + "/admin_l_posts", tableParser.POSTS, isKnown)
 
 	# Return list of bans from cbox control panel
 	def fetchBans(self):
 		print "Getting bans..."
-		pages = self._requestPages("https://www.cbox.ws/admin_l_bans")
-
-		bans = []
-
-		for html in pages:
-			trs = html.findAll("tr")
-			for tri in range(1, len(trs)):
-				tds = trs[tri].findAll("td")
-				if "No bans found" in tds[0].text:
-					break
-
-				ban = {}
-
-				ban["name"] = tds[1].text.strip() # ???
-				ban["reason"] = tds[2].text.strip()
-				ban["ip"] = tds[3].text.strip()
-				ban["date"] = tds[4].text.strip()
-				ban["expiry"] = tds[5].text.strip()
-
-				bans.append(ban)
-
-		return bans
+		return self._requestPages(self.siteUrl + "/admin_l_bans", tableParser.BANS)
 
 
 	#-- Message handling --#
 
-	# Starts from last message in history and searches forward to the most recent id.
+	# Finds the most recent message id, starting from the stored cursor if there is one.
 	# The latest id ensures we only collect new/unread messages.
-	def findLatestChatId(self):
+	def findLatestChatId(self, cursor=None):
 		print "Finding most recent message id..."
 
+		if cursor:
+			messages = self._probeChat(cursor)
+			if messages:
+				return self._searchLatestChatId(messages[0].id)
+			# The cursor is the latest id if the message at the cursor still exists
+			if self._probeChat(cursor - 1):
+				print "Message id found ({})".format(cursor)
+				return cursor
+			print "Stored message id ({}) is stale, searching from the start".format(cursor)
+
 		# Since cbox's history is limited, the server returns
 		# the oldest available message when msgId=0 is requested.
-		msgId = 0
-		lastId = 0
-
-		# If cbox is Pro with larger history, this function oughta be optimized.
+		messages = self._probeChat(0)
+		if not messages:
+			print "Message id found (0)"
+			return 0
+		return self._searchLatestChatId(messages[0].id)
+
+	# Search for the latest id from a known message id, in O(log n) requests.
+	# Any id before the latest returns messages, so gallop forward until a request comes back empty,
+	# then binary search between the last id known to exist and the empty one.
+	def _searchLatestChatId(self, low):
+		step = 64
+		high = low + step
 		while True:
-			messages = self.getChat(msgId)
-			if len(messages) == 0:
-				print "Message id found ({})".format(msgId)
-				return msgId
-			msgId = messages[0].id
-
-			if msgId <= lastId:
-				raise Exception("Something went wrong.")
-			lastId = msgId
+			messages = self._probeChat(high)
+			if not messages:
+				break
+			low = messages[0].id
+			step *= 2
+			high = low + step
+
+		while low < high:
+			mid = (low + high) // 2
+			messages = self._probeChat(mid)
+			if messages:
+				low = messages[0].id
+			else:
+				high = mid
+
+		print "Message id found ({})".format(low)
+		return low
+
+	# Return messages after msgId, newest first. An empty response must mean there are none.
+	def _probeChat(self, msgId):
+		messages = self.getChat(msgId)
+		if self.lastChatFailed:
+			raise Exception("Cannot connect to cbox while searching for the most recent message id.")
+		return messages
+
+	# Return the message id stored by saveCursor, if any
+	def loadCursor(self):
+		filePath = config.DB_PATH + config.CURSOR_PATH
+		if not os.path.exists(filePath):
+			return None
+		with open(filePath, 'r') as file:
+			return json.loads(file.read())['last chat id']
+
+	# Store the latest message id, so a restart can resume from it
+	def saveCursor(self):
+		if self.lastChatId == self.savedChatId:
+			return
+		if not os.path.exists(config.DB_PATH):
+			os.makedirs(config.DB_PATH)
+		utils.writeAtomic(config.DB_PATH + config.CURSOR_PATH, json.dumps({'last chat id': self.lastChatId}))
+		self.savedChatId = self.lastChatId
 
 	# Fetch chat messages from the cbox chat
 	# Returns list of CboxMessage objects from msgId and forward.
@@ -187,7 +221,7 @@ class Cbox:
 		# If no message id is specified, pick the most recent chat id.
 		if msgId == None:
 			if self.lastChatId == None:
-				self.lastChatId = self.findLatestChatId()
+				self.lastChatId = self.findLatestChatId(self.loadCursor())
 			msgId = self.lastChatId
 
 		get = {
@@ -196,30 +230,25 @@ class Cbox:
 			'fwd': 1, # ?
 			'aj': 1 # Cbox version
 		}
-		url = "www{}.cbox.ws/box/?boxid={}&boxtag={}&sec=archive".format(self.boxInfo['srv'], self.boxInfo['id'], self.boxInfo['tag'])
+		url = "{}?boxid={}&boxtag={}&sec=archive".format(self.boxUrl, self.boxInfo['id'], self.boxInfo['tag'])
 		url += "&" + urlencode(get)
 
+		metrics.counter('chat polls').inc()
 		try:
-			# Send GET request to url, writing response to buf
-			buf = io.BytesIO()
-
-			c = pycurl.Curl()
-			c.setopt(c.WRITEFUNCTION, buf.write)
-			c.setopt(c.URL, url)
-			c.perform()
-
-			code = c.getinfo(pycurl.HTTP_CODE)
+			with metrics.timer('chat poll time'):
+				code, result = self.chatTransport.get(url)
 			if code < 200 or code >= 300:
 				raise Warning("Cannot connect to cbox. Please check that boxInfo is correct.")
 
-			result = buf.getvalue().decode('utf-8')
+			result = result.decode('utf-8')
 			result = result.split('\n')[1:]
+			self.lastChatFailed = False
 
 		except pycurl.error:
 			print 'WARNING: Cannot connect to cbox'
+			metrics.counter('chat poll errors').inc()
+			self.lastChatFailed = True
 			return []
-		finally:
-			buf.close()
 
 		# Return list of CboxMessage objects
 		messages = []
@@ -239,6 +268,9 @@ class Cbox:
 			traceback.print_exc()
 			print
 		finally:
+			metrics.counter('chat messages').inc(len(messages))
+			metrics.histogram('messages per poll', countBounds).observe(len(messages))
+			metrics.gauge('last chat id').set(self.lastChatId)
 			return messages
 
 	# Send chat message to the cbox chat
@@ -252,30 +284,22 @@ class Cbox:
 			'pst': msg.encode('utf-8'), # Message
 			'aj': '1' # Cbox version
 		}
-		url = "www{}.cbox.ws/box/?boxid={}&boxtag={}&sec=submit".format(self.boxInfo['srv'], self.boxInfo['id'], self.boxInfo['tag'])
+		url = "{}?boxid={}&boxtag={}&sec=submit".format(self.boxUrl, self.boxInfo['id'], self.boxInfo['tag'])
 
+		metrics.counter('chat posts').inc()
 		try:
-			# Send POST request to url, writing response to buf
-			buf = io.BytesIO()
-
-			c = pycurl.Curl()
-			c.setopt(c.URL, url)
-			c.setopt(c.WRITEFUNCTION, buf.write)
-			c.setopt(c.POSTFIELDS, urlencode(post))
-			c.perform()
-
-			code = c.getinfo(pycurl.HTTP_CODE)
+			with metrics.timer('chat post time'):
+				code, result = self.chatTransport.post(url, urlencode(post))
 			if code < 200 or code >= 300:
 				raise Warning("Cannot connect to cbox. Please check that boxInfo is correct.")
 
-			result = buf.getvalue().decode('utf-8')
+			result = result.decode('utf-8')
 			result = result[1:-1].split('\t')
 
 		except pycurl.error:
 			print 'WARNING: Cannot connect to cbox'
+			metrics.counter('chat post errors').inc()
 			return []
-		finally:
-			buf.close()
 
 		# Unused
 		errmsg = result[0]		
@@ -293,17 +317,17 @@ class Cbox:
 
 		if errcode:
 			print 'ERROR:', errcode, errmsg
+			metrics.counter('chat post errors').inc()
 			return
 
 
 	#--- User methods management ---#
 
 	# Decorator that stores a method with a given regex
-	def method(self, expr):
-		regex = re.compile(expr, re.IGNORECASE)
-
+	# The method runs on the command pool, limited by timeout, per-user cooldown and concurrency.
+	def method(self, expr, timeout=config.COMMAND_TIMEOUT, cooldown=config.COMMAND_COOLDOWN, concurrency=config.COMMAND_CONCURRENCY):
 		def wrapper(func):
-			self.userMethods.append((regex, func))
+			self.dispatcher.add(expr, Command(func, timeout, cooldown, concurrency))
 
 			def func_wrapper(message, *args, **kwargs):
 				return func(message, *args, **kwargs)
@@ -311,7 +335,7 @@ class Cbox:
 		return wrapper
 
 
-	#--- Main loop ---#
+	#--- Incoming messages ---#
 
 	# Handle one new message
 	def _onMessage(self, message):
@@ -325,89 +349,164 @@ class Cbox:
 		if message.name == self.botInfo['name']:
 			return
 
-		self.lastChatTime = message.time
-
 		# Call user methods upon matching regex
-		for regex, func in self.userMethods:
-			match = regex.match(message.content)
-			if match:
-				print message
-				self.lastCommandTime = message.time
-
-				response = func(message, *match.groups())
-				if response:
-					self.postChat(str(response))
-
-	# Gather new messages
+		for command, match in self.dispatcher.match(message.content):
+			print message
+			self.scheduler.onCommand()
+			metrics.counter('commands').inc()
+
+			call = lambda command=command, args=match.groups(): self._callMethod(command, message, args)
+			if not self.commandPool.submit(command, message.name, call):
+				metrics.counter('commands refused').inc()
+
+	# Run a user method, returning its response
+	def _callMethod(self, command, message, args):
+		# Never see the database halfway through an update commit
+		with self.db.lock.reading(), metrics.timer('command time'), metrics.timer('command {} time'.format(command.name)):
+			try:
+				response = command.func(message, *args)
+			except Exception:
+				metrics.counter('command errors').inc()
+				raise
+		if response:
+			return str(response)
+
+	# Gather new messages for the handle task, returning how many arrived
 	def fetchMessages(self):
 		messages = self.getChat()
 		messages.reverse()
 		for message in messages:
-			self._onMessage(message)
+			self.inbox.put(message)
+		return len(messages)
 
 	# Update
+	# Incremental updates only fetch pages with unknown rows. A full update is still done
+	# every config.SYNC_FULL_INTERVAL seconds, in case a change was missed.
+	# Everything is fetched before the database is touched, then committed in one go.
 	def fetchUpdates(self):
 		print
-		self.db.updateUsers(self.fetchUsers())
-		self.fetchMessages() # Update fetching takes a while
-		self.db.updatePosts(self.fetchPosts())
-		#self.db.updateBans(self.fetchBans())
-
-		self.lastFetchTime = time.time()
-		self.lastFetchMsgCount = 0
+		incremental = config.SYNC_INCREMENTAL and time.time() - self.lastFullSyncTime < config.SYNC_FULL_INTERVAL
+		if not incremental:
+			self.lastFullSyncTime = time.time()
+
+		metrics.counter('incremental syncs' if incremental else 'full syncs').inc()
+		with metrics.timer('sync users time'):
+			users = self.fetchUsers(incremental)
+		with metrics.timer('sync posts time'):
+			posts = self.fetchPosts(incremental)
+		#bans = self.fetchBans()
+
+		with metrics.timer('sync commit time'):
+			self.db.commit(users, posts)
+		metrics.gauge('last sync').set(int(time.time()))
 		print 'Update complete'
 
-	# Start the main loop.
-	# It will continuously fetch messages and user info.
-	def run(self):
+	# Queue a chat message to be sent by the send task
+	def send(self, msg):
+		self.outbox.put(msg)
+
+
+	#--- Tasks ---#
+
+	# Poll for new messages, returning seconds until the next poll
+	def _pollStep(self):
+		try:
+			count = self.fetchMessages()
+			self.scheduler.onPoll(count, self.lastChatFailed)
+			self.saveCursor()
+		except Exception:
+			traceback.print_exc()
+			self.scheduler.onPoll(0, True)
+
+		delay = self.scheduler.nextDelay()
+		metrics.gauge('poll delay').set(delay)
+		metrics.gauge('inbox').set(self.inbox.qsize())
+		metrics.gauge('outbox').set(self.outbox.qsize())
+		return delay
+
+	# Handle incoming messages in order
+	def _handleStep(self):
+		# Also gives up on timed out commands while no new ones finish
+		self.commandPool.flush()
+
+		try:
+			message = self.inbox.get(timeout=1)
+		except Queue.Empty:
+			return 0
+		self._onMessage(message)
+		return 0
+
+	# Send queued messages in order
+	def _sendStep(self):
+		try:
+			msg = self.outbox.get(timeout=1)
+		except Queue.Empty:
+			return 0
+		self.postChat(msg)
+		return 0
+
+	# Update the database when it's due
+	def _syncStep(self):
+		# Update at least every config.UPDATE_MESSAGE_LIMIT messages, and at least once every config.UPDATE_INTERVAL seconds
+		if self.lastFetchMsgCount > config.UPDATE_MESSAGE_LIMIT or time.time() - self.lastFetchTime > config.UPDATE_INTERVAL:
+			self.lastFetchTime = time.time()
+			self.lastFetchMsgCount = 0
+			with metrics.timer('sync time'):
+				self.fetchUpdates()
+		return 5
+
+	# Write the metrics file
+	def _metricsStep(self):
+		self.saveMetrics()
+		return config.METRICS_FLUSH_INTERVAL
+
+	# Write a snapshot of the metrics to config.METRICS_PATH in config.DB_PATH
+	def saveMetrics(self):
+		snapshot = metrics.snapshot()
+		snapshot['chat transport'] = self.chatTransport.getStats()
+		snapshot['panel transport'] = self.panelTransport.getStats()
+		snapshot['scheduler'] = dict(self.scheduler.stats)
+		if not os.path.exists(config.DB_PATH):
+			os.makedirs(config.DB_PATH)
+		utils.writeAtomic(config.DB_PATH + config.METRICS_PATH, json.dumps(snapshot, indent=1))
+
+	# Start polling, handling, sending and syncing, each as a task on its own thread
+	def start(self):
 		self.db = Database()
 
-		# Main loop
 		print
-		print 'Starting main loop...'
-		while True:
-			self.fetchMessages()
+		print 'Starting tasks...'
+		self.tasks = TaskGroup()
+		self.tasks.add("poll", self._pollStep)
+		self.tasks.add("handle", self._handleStep)
+		self.tasks.add("send", self._sendStep)
+		self.tasks.add("sync", self._syncStep)
+		if config.METRICS_PATH:
+			self.tasks.add("metrics", self._metricsStep)
+		self.tasks.start()
+
+	# Cancel all tasks, waiting up to timeout seconds for them to finish
+	def stop(self, timeout=30):
+		print 'Stopping tasks...'
+		running = self.tasks.stop(timeout)
+		if running:
+			print 'WARNING: Tasks still running:', ', '.join(running)
+		self.pageFetcher.close(timeout)
+		if config.METRICS_PATH:
+			self.saveMetrics()
+
+	# Start the bot and block until interrupted.
+	# It will continuously fetch messages and user info.
+	def run(self):
+		self.start()
+		try:
+			while self.tasks.isAlive():
+				time.sleep(1)
+		except KeyboardInterrupt:
+			pass
+		self.stop()
 
-			# Update at least every 200 messages
-			if self.lastFetchMsgCount > 200:
-				self.fetchUpdates()
-			# Update at least once every 4 hours
-			if time.time() - self.lastFetchTime > 4*60*60:
-				self.fetchUpdates()
 
-			# If no messages for 30 minutes, take it easy.
-			if time.time() - self.lastChatTime > 30*60:
-				time.sleep(15)
-			# If no issued commands for 5 minutes, bot not needed.
-			elif time.time() - self.lastCommandTime > 5*60:
-				time.sleep(5)
-			# People are using the bot.
-			else:
-				time.sleep(2)
-
-
-# CboxMessage stores an incoming chat message from Cbox. These are not stored in the database.
-class CboxMessage:
-	levels = ["normal", "registered", "moderator", "admin", "bot", "reserved"]
-
-	def __init__(self, data):
-		self.id = int(data[0]) # Message id
-		self.time = int(data[1]) # Unix timestamp
-		self.date = utils.convertDate(data[2].split(',')[0]) # Date string
-		self.name = data[3] # Author's name
-		self.level = self.levels[int(data[4])-1] # Privileges
-		self.exturl = data[5] # Email/url
-		self.content = BeautifulSoup(data[6], "html.parser").text # Message text
-		self.imgurl = data[7] # Image url
-		self.badFlags = int(data[8]) # Message type flags
-		self.userid = data[9] # Author's id
-		self.flaghtml = data[10]
-		self.localId = data[11]
-
-		self.isRedirected = bool(self.badFlags & 16)
-		self.isPrivate = bool(self.badFlags & 32)
-		self.isSticky = self.id == -1
-		self.isTemp = self.id == 0
-
-	def __str__(self):
-		return unicode(u'[{}] {}: {}'.format(self.date, self.name, self.content[:20])).encode('utf-8')
+# Raised when a control panel page asks to log in again
+class SessionExpired(Exception):
+	pass
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import re, HTMLParser
+import utils
+
+
+tagPattern = re.compile(r'<(?:[^>"\']|"[^"]*"|\'[^\']*\')*>') # Quoted attributes may contain '>'
+htmlParser = HTMLParser.HTMLParser()
+
+# Return the plain text of a chat message's html, without building a DOM
+def htmlToText(html):
+	if '<' in html:
+		html = tagPattern.sub(u'', html)
+	if '&' in html:
+		html = htmlParser.unescape(html)
+	return html
+
+
+# CboxMessage stores an incoming chat message from Cbox. These are not stored in the database.
+# A message is one tab-separated line of the archive response. Only the id, time and name are
+# read up front; the other fields are parsed the first time they are used.
+class CboxMessage(object):
+	__slots__ = ['data', 'id', 'time', 'name', '_date', '_content']
+
+	levels = ["normal", "registered", "moderator", "admin", "bot", "reserved"]
+
+	def __init__(self, data):
+		if len(data) < 12:
+			raise ValueError("Malformed chat message: {}".format(data))
+		self.data = data
+		self.id = int(data[0]) # Message id
+		self.time = int(data[1]) # Unix timestamp
+		self.name = data[3] # Author's name
+		self._date = None
+		self._content = None
+
+	# Date string
+	@property
+	def date(self):
+		if self._date is None:
+			self._date = utils.convertDate(self.data[2].split(',')[0])
+		return self._date
+
+	# Message text
+	@property
+	def content(self):
+		if self._content is None:
+			self._content = htmlToText(self.data[6])
+		return self._content
+
+	# Privileges
+	@property
+	def level(self):
+		return self.levels[int(self.data[4])-1]
+
+	# Email/url
+	@property
+	def exturl(self):
+		return self.data[5]
+
+	# Image url
+	@property
+	def imgurl(self):
+		return self.data[7]
+
+	# Message type flags
+	@property
+	def badFlags(self):
+		return int(self.data[8])
+
+	# Author's id
+	@property
+	def userid(self):
+		return self.data[9]
+
+	@property
+	def flaghtml(self):
+		return self.data[10]
+
+	@property
+	def localId(self):
+		return self.data[11]
+
+	@property
+	def isRedirected(self):
+		return bool(self.badFlags & 16)
+
+	@property
+	def isPrivate(self):
+		return bool(self.badFlags & 32)
+
+	@property
+	def isSticky(self):
+		return self.id == -1
+
+	@property
+	def isTemp(self):
+		return self.id == 0
+
+	def __str__(self):
+		return unicode(u'[{}] {}: {}'.format(self.date, self.name, self.content[:20])).encode('utf-8')
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import threading, traceback, time, collections, Queue
+
+
+# Command is a user method with its execution limits.
+class Command:
+	def __init__(self, func, timeout, cooldown, concurrency):
+		self.func = func
+		self.name = func.__name__
+		self.timeout = timeout # Seconds a call may run, or wait for a worker, before its response is given up on
+		self.cooldown = cooldown # Seconds a user must wait between uses
+		self.concurrency = concurrency # Max calls running at once
+
+		self.running = 0
+		self.lastUse = {} # Username -> time of last use
+
+
+# Job is one call of a command, waiting for its response to be sent.
+class Job:
+	def __init__(self, command, call):
+		self.command = command
+		self.call = call
+		self.submitted = time.time()
+		self.started = None # Time a worker started the call
+		self.result = None
+		self.done = False
+		self.timedOut = False
+		self.replaced = False # Whether its worker was replaced while the call hung
+
+
+# CommandPool runs commands on a fixed number of worker threads.
+# Responses are sent in the order the commands were issued. A command running past its timeout,
+# counted from when a worker starts it, is logged and skipped, so it doesn't hold back the responses after it.
+# A command that waited longer than its timeout for a worker is skipped without running.
+# Threads can't be cancelled, so a timed out call keeps running until it returns. Its concurrency slot is freed
+# and its worker is replaced by a new one, so hung calls don't starve other commands.
+# At most as many hung workers as there are workers are replaced.
+class CommandPool:
+	def __init__(self, workers, queueSize, send):
+		self.send = send # Called with each response
+		self.workers = workers
+		self.hung = 0 # Workers replaced while stuck in a timed out call
+		self.threadCount = 0
+		self.jobs = Queue.Queue(queueSize)
+		self.pending = collections.deque() # Jobs in submission order, until their response is sent
+		self.lock = threading.Lock()
+		self.sendLock = threading.Lock()
+
+		for i in range(workers):
+			self._startWorker()
+
+	# Queue call as a use of command by user. Returns False if it was refused.
+	def submit(self, command, user, call):
+		now = time.time()
+
+		with self.lock:
+			if now - command.lastUse.get(user, 0) < command.cooldown:
+				print 'Ignoring {} from {}: cooling down'.format(command.name, user.encode('utf-8'))
+				return False
+			if command.running >= command.concurrency:
+				print 'Ignoring {} from {}: {} already running'.format(command.name, user.encode('utf-8'), command.running)
+				return False
+
+			job = Job(command, call)
+			try:
+				self.jobs.put_nowait(job)
+			except Queue.Full:
+				print 'Ignoring {} from {}: command queue is full'.format(command.name, user.encode('utf-8'))
+				return False
+
+			command.lastUse[user] = now
+			command.running += 1
+			self.pending.append(job)
+		return True
+
+	# Send finished responses in order, giving up on commands past their timeout
+	def flush(self):
+		# One flusher at a time, so responses can't overtake each other
+		with self.sendLock:
+			ready = []
+			with self.lock:
+				now = time.time()
+				while self.pending:
+					job = self.pending[0]
+					if job.done:
+						if job.result:
+							ready.append(job.result)
+					elif job.started is None and now - job.submitted > job.command.timeout:
+						self._giveUp(job, 'expired after waiting {:.1f} seconds for a worker'.format(now - job.submitted))
+					elif job.started is not None and now - job.started > job.command.timeout:
+						self._giveUp(job, 'timed out after {:.1f} seconds'.format(now - job.started))
+						if self.hung < self.workers:
+							self.hung += 1
+							job.replaced = True
+							self._startWorker()
+					else:
+						break
+					self.pending.popleft()
+
+			for result in ready:
+				self.send(result)
+
+
+	def _startWorker(self):
+		thread = threading.Thread(target=self._worker, name="command-{}".format(self.threadCount))
+		thread.daemon = True
+		thread.start()
+		self.threadCount += 1
+
+	# Stop waiting for job, freeing its command's concurrency slot
+	def _giveUp(self, job, reason):
+		print 'WARNING: {} {}'.format(job.command.name, reason)
+		job.timedOut = True
+		job.command.running -= 1
+
+	def _worker(self):
+		while True:
+			job = self.jobs.get()
+			with self.lock:
+				if not job.timedOut and time.time() - job.submitted > job.command.timeout:
+					self._giveUp(job, 'expired after waiting {:.1f} seconds for a worker'.format(time.time() - job.submitted))
+				if job.timedOut:
+					job.done = True
+					continue
+				job.started = time.time()
+
+			try:
+				job.result = job.call()
+			except Exception:
+				print 'ERROR: {} failed'.format(job.command.name)
+				traceback.print_exc()
+
+			with self.lock:
+				job.done = True
+				if job.timedOut:
+					print 'WARNING: {} finished after {:.1f} seconds, response dropped'.format(job.command.name, time.time() - job.started)
+				else:
+					job.command.running -= 1
+				if job.replaced:
+					self.hung -= 1
+
+			self.flush()
+			# A replacement took this worker's place while it hung
+			if job.replaced:
+				return
@@ -1,9 +1,77 @@
 
 #--- Database ---#
 
+DB_BACKEND = "file" # "file" or "sqlite"
 DB_PATH = "data/"
 DB_USERS_PATH = "users.json"
+DB_USERS_LOG_PATH = "users.log"
+DB_USERS_COMPACT_LIMIT = 10000 # Changed users appended to the log before it's merged into users.json
+DB_ALIASES_PATH = "aliases.json"
+DB_ALIASES_LOG_PATH = "aliases.log"
+DB_NAME_NORMALIZATION = "NFKC" # Unicode normal form for name lookups, or None
 DB_POSTS_PATH = "posts.txt"
+DB_POSTS_LOG_PATH = "posts.log"
+DB_POSTS_MANIFEST_PATH = "posts.json"
+DB_POSTS_HASHES_PATH = "posts.hashes"
+DB_POSTS_INDEX_PATH = "posts.idx"
+DB_POSTS_COMPACT_LIMIT = 10000 # Appended posts before the log is merged into posts.txt
+DB_POSTS_IMPORT_COMPACT_LIMIT = 100000 # Appended posts before the log is merged into posts.txt during an archive import. Bounds import memory.
+DB_SQLITE_PATH = "cbox.db"
+CURSOR_PATH = "cursor.json" # Latest chat message id, stored in DB_PATH
+
+
+#--- Cbox ---#
+
+CBOX_SITE_URL = "https://www.cbox.ws" # Login and control panel
+CBOX_BOX_URL = "www{srv}.cbox.ws/box/" # Chat box, {srv} is the box server number from boxInfo
+
+
+#--- HTTP ---#
+
+HTTP_CHAT_TIMEOUT = 15 # Seconds per chat request
+HTTP_PANEL_TIMEOUT = 30 # Seconds per control panel page
+HTTP_CONNECT_TIMEOUT = 10 # Seconds to connect
+HTTP_RETRIES = 2 # Extra attempts after a connection or server error
+HTTP_BACKOFF = 1.0 # Seconds before the first retry, doubled for each retry
+HTTP_DNS_CACHE_TIMEOUT = 600 # Seconds to cache DNS lookups
+
+
+#--- Control panel ---#
+
+FETCH_WORKERS = 4 # Pages fetched at once
+UPDATE_MESSAGE_LIMIT = 200 # Chat messages between updates
+UPDATE_INTERVAL = 4*60*60 # Longest time in seconds between updates
+SYNC_INCREMENTAL = True # Stop fetching users and posts at the first page without changes
+SYNC_FULL_INTERVAL = 24*60*60 # Seconds between full fetches of every page
+
+
+#--- Chat polling ---#
+
+POLL_SCHEDULER = "adaptive" # "adaptive" to follow the message rate, "fixed" for 15/5/2 second steps
+POLL_FLOOR = 2 # Shortest seconds between polls
+POLL_CEILING = 15 # Longest seconds between polls, when idle
+POLL_QUIET_CEILING = 5 # Longest seconds between polls, when messages are rare but not idle
+POLL_IDLE_TIME = 30*60 # Seconds without messages before the chat counts as idle
+POLL_ERROR_CEILING = 5*60 # Longest seconds between polls, when failing
+POLL_JITTER = 0.1 # Random fraction added or removed from each delay
+POLL_HALF_LIFE = 60 # Seconds for the measured message rate to adapt halfway
+POLL_COMMAND_WINDOW = 5*60 # Seconds to poll at the floor after a command
+
+
+#--- Commands ---#
+
+COMMAND_MATCH_MODE = "all" # "first" to only call the first method matching a message, "all" to call every one
+COMMAND_WORKERS = 4 # Commands running at once
+COMMAND_QUEUE_SIZE = 20 # Commands waiting for a worker before new ones are refused
+COMMAND_TIMEOUT = 10 # Seconds a command may run, or wait for a worker, before its response is given up on
+COMMAND_COOLDOWN = 2 # Seconds a user must wait between uses of a command
+COMMAND_CONCURRENCY = 2 # Calls of one command running at once
+
+
+#--- Metrics ---#
+
+METRICS_PATH = "metrics.json" # File the bot's metrics are written to in DB_PATH, or None to keep them in memory only
+METRICS_FLUSH_INTERVAL = 60 # Seconds between writes of the metrics file
 
 
 #--- CBox info ---#
@@ -2,20 +2,36 @@
 # Copyright (c) 2018, Måns Gezelius (Golen)
 # All rights reserved.
 
-import os, json, datetime
+import datetime
 import utils
 import config
+from storage import createStorage
+from aliasIndex import AliasIndex
+from nameIndex import NameIndex
+from metrics import registry as metrics
+
+
+strings = utils.StringPool() # Names and ips shared by all posts and users
 
 
 # Database management class for userdata and posts.
 class Database:
 	dbPath = config.DB_PATH
-	usersPath = config.DB_USERS_PATH
-	postsPath = config.DB_POSTS_PATH
+	aliasesPath = config.DB_ALIASES_PATH
+	aliasesLogPath = config.DB_ALIASES_LOG_PATH
+	nameNormalization = config.DB_NAME_NORMALIZATION
 
-	def __init__(self):
+	def __init__(self, backend=config.DB_BACKEND):
 		self.users = None
 		self.posts = None
+		self.aliases = None
+		self.names = None
+		self.storage = createStorage(backend)
+		self.dedup = self.storage.createDedup()
+		self.changedUsers = set() # Names of users changed since they were last saved
+
+		# Written while changes are committed. Readers that need a consistent view read it.
+		self.lock = utils.ReadWriteLock()
 
 		self.load()
 
@@ -24,41 +40,64 @@ class Database:
 	def load(self):
 		self.loadUsers()
 		self.loadPosts()
+		self.loadPostCounts()
+		self.loadDedup()
 
 	# Load users database
 	def loadUsers(self):
 		self.users = {}
+		self.names = NameIndex(self.nameNormalization)
 
-		if not os.path.exists(self.dbPath):
-			os.makedirs(self.dbPath)
-
-		filePath = self.dbPath + self.usersPath
-		if os.path.exists(filePath) and os.path.getsize(filePath) > 0:
-			with open(filePath, 'r') as file:
-				package = json.loads(file.read())
-				for pack in package:
-					user = User()
-					user.unpack(pack)
-					self.users[user.name] = user
+		for pack in self.storage.loadUsers():
+			user = User()
+			user.unpack(pack)
+			self._addUser(user)
 		print 'Loading database users... {} users loaded'.format(len(self.users))
 
+		self.loadAliases()
+
+	# Load alias index, rebuilding it if it doesn't match the users database
+	def loadAliases(self):
+		self.aliases = AliasIndex()
+
+		if self.aliases.load(self.dbPath + self.aliasesPath, self.dbPath + self.aliasesLogPath, self._aliasSignature()):
+			return
+
+		print 'Rebuilding alias index...'
+		self.aliases = AliasIndex()
+		for name in self.users:
+			self._indexUser(self.users[name])
+		self.saveAliases()
+
 	# Load posts database
+	# Posts are read from storage as they are used, only the recently appended ones are loaded now.
 	def loadPosts(self):
-		self.posts = []
-
-		if not os.path.exists(self.dbPath):
-			os.makedirs(self.dbPath)
-
-		filePath = self.dbPath + self.postsPath
-		if os.path.exists(filePath) and os.path.getsize(filePath) > 0:
-			with open(filePath, 'r') as file:
-				package = file.read().decode('utf8').splitlines()
-				for pack in package:
-					post = Post()
-					post.unpack(pack)
-					self.posts.append(post)
+		self.posts = self.storage.loadPosts(Post)
 		print 'Loading database posts... {} posts loaded'.format(len(self.posts))
 
+	# Check the per-user post counters against the posts database, recounting if they disagree
+	def loadPostCounts(self):
+		if sum(self.users[name].postCount for name in self.users) == len(self.posts):
+			return
+
+		print 'Recounting posts per user...'
+		for name in self.users:
+			self.users[name].resetPostCount()
+		for post in self.posts:
+			if post.name not in self.users:
+				user = User()
+				user.name = post.name
+				self._addUser(user)
+				self._indexUser(user)
+			self.users[post.name].countPost(post.date)
+		self.saveUsers()
+
+	# Load post hashes for duplicate checks, rebuilding them if they don't match the posts database
+	def loadDedup(self):
+		if not self.dedup.load(len(self.posts)):
+			print 'Rebuilding post hashes...'
+			self.dedup.rebuild(self.posts)
+
 
 	# Save users and posts
 	def save(self):
@@ -67,29 +106,170 @@ class Database:
 
 	# Save users database
 	def saveUsers(self):
-		if not os.path.exists(self.dbPath):
-			os.makedirs(self.dbPath)
+		with metrics.timer('db save users time'):
+			self.storage.saveUsers([self.users[user].pack() for user in self.users])
+		self.changedUsers = set()
+		self.saveAliases()
+
+	# Save users changed since they were last saved, and the alias links they added.
+	# Only the changed ones are written, until enough have changed to save them all.
+	def saveChangedUsers(self):
+		if not self.changedUsers:
+			return
+		if self.storage.needsUserCompaction(len(self.changedUsers)):
+			self.saveUsers()
+			return
+
+		with metrics.timer('db append users time'):
+			self.storage.appendUsers([self.users[name].pack() for name in self.changedUsers])
+			self.aliases.appendLog(self.dbPath + self.aliasesLogPath, self._aliasSignature())
+		self.changedUsers = set()
 
-		filePath = self.dbPath + self.usersPath
-		with open(filePath, 'w') as file:
-			package = [self.users[user].pack() for user in self.users]
-			package = json.dumps(package, ensure_ascii=False, indent=1)
-			file.write(package.encode('utf-8'))
+	# Save alias index
+	def saveAliases(self):
+		with metrics.timer('db save aliases time'):
+			self.aliases.save(self.dbPath + self.aliasesPath, self.dbPath + self.aliasesLogPath, self._aliasSignature())
 
-	# Save posts database
+	# Save posts database, compacting the post log
 	def savePosts(self):
-		if not os.path.exists(self.dbPath):
-			os.makedirs(self.dbPath)
+		newest = self.posts.newest()
+		highWater = utils.formatDate(newest.date) if newest else None
+		with metrics.timer('db save posts time'):
+			self.storage.savePosts(self.posts.packs(), highWater)
+
+		# Appended posts are part of the stored posts now, they don't need to be kept in memory
+		self.posts = self.storage.loadPosts(Post)
+
+	# Append new posts to the posts database.
+	# compactLimit overrides how many posts the log may hold before it's compacted.
+	def appendPosts(self, posts, compactLimit=None):
+		# Large batches are cheaper to merge by compacting than by appending
+		if self.storage.needsCompaction(len(posts), compactLimit):
+			print 'Compacting post log...'
+			self.savePosts()
+			return
+
+		highWater = utils.formatDate(max(post.date for post in posts))
+		with metrics.timer('db append posts time'):
+			self.storage.appendPosts([post.pack() for post in posts], highWater)
+
 
-		filePath = self.dbPath + self.postsPath
-		with open(filePath, 'w') as file:
-			package = [post.pack()+'\n' for post in self.posts]
-			package = [p.encode('utf8') for p in package]
-			file.writelines(package)
+	# Insert fetched users and posts as one change.
+	# The change is made in memory under the write lock and written to disk after it's released,
+	# so commands reading the database don't wait on disk. Only the sync task writes, so nothing changes in between.
+	def commit(self, users, posts):
+		posts = self._orderPosts(posts)
+		with self.lock.writing():
+			self._mergeUsers(users)
+			newPosts = self._mergePosts(posts)
 
+		if newPosts:
+			print len(newPosts), 'posts inserted'
+		self._storePosts(newPosts)
+		self.saveChangedUsers()
 
 	# Insert new userdata into users database
 	def updateUsers(self, users):
+		self._mergeUsers(users)
+		self.saveChangedUsers()
+
+	# Insert new messages into posts database
+	# [old, ..., new]
+	def updatePosts(self, posts):
+		posts = self._orderPosts(posts)
+		if posts:
+			self.mergePosts([posts])
+
+	# Insert batches of new messages into posts database.
+	# Each batch should be ordered [old, ..., new], but batches may arrive in any order.
+	# Posts are stored batch by batch, so only the post log stays in memory however many batches there are.
+	# Imports can let the log grow to a larger compactLimit, so they don't rewrite posts.txt for every batch.
+	def mergePosts(self, batches, compactLimit=None):
+		postCount = 0
+		userCount = len(self.users)
+
+		for posts in batches:
+			postCount += self._storePosts(self._mergePosts(posts), compactLimit)
+
+		# Don't leave an import's post log for every load to read
+		if compactLimit and self.storage.needsCompaction():
+			print 'Compacting post log...'
+			self.savePosts()
+
+		if postCount > 0:
+			print postCount, 'posts inserted'
+		if len(self.users) > userCount:
+			print len(self.users) - userCount, 'users inserted'
+		# Post counters are stored with the users
+		self.saveChangedUsers()
+
+
+	# Whether a user from the control panel has nothing newer than the users database
+	def isKnownUser(self, data):
+		user = self.users.get(data['name'])
+		if not user:
+			return False
+		if data['ip'] != '0.0.0.0' and data['ip'] not in user.ip:
+			return False
+		return utils.parseDate(data['last used']) <= user.lastUsed
+
+	# Whether a post from the control panel is already in the posts database.
+	# Posts older than the newest stored post are taken as known.
+	def isKnownPost(self, data):
+		newest = self.posts.newest()
+		if not newest:
+			return False
+		date = utils.parseDate(data['date'])
+		if date < newest.date:
+			return True
+		return Post(data) in self.dedup
+
+	# Find all users related by name or ip
+	def getAlias(self, name):
+		if name not in self.users:
+			return []
+		return self.aliases.getAlias(name)
+
+	# Get number of posts by a user
+	def getPostCountByUser(self, name):
+		if name not in self.users:
+			return 0
+		return self.users[name].postCount
+
+	# Return posts from start up to, but not including, end (timestamps), oldest first
+	def getPostsBetween(self, start, end):
+		return self.posts.between(start, end)
+
+	# Return the newest post by a user, or None
+	def getLastPost(self, name):
+		user = self.users.get(name)
+		if not user or user.lastPost is None:
+			return None
+		for post in reversed(self.posts.between(user.lastPost, user.lastPost + 1)):
+			if post.name == name:
+				return post
+		return None
+
+	# Return user from case-insensitive name search
+	def findUserByName(self, name):
+		if name in self.users:
+			return self.users[name]
+		names = self.names.find(name)
+		if names:
+			return self.users[names[0]]
+		return None
+
+	# Return names of users whose name starts with prefix
+	def findUsersByPrefix(self, prefix, limit=10):
+		return self.names.findByPrefix(prefix, limit)
+
+	# Return names of users with names similar to name, for "did you mean" replies
+	def suggestUserNames(self, name, limit=3):
+		return self.names.suggest(name, limit)
+
+
+	# Merge userdata into the users in memory
+	def _mergeUsers(self, users):
 		newUserCount = 0
 
 		for data in users:
@@ -97,110 +277,76 @@ class Database:
 			if user.name in self.users:
 				self.users[user.name].merge(user)
 			else:
-				self.users[user.name] = user
+				self._addUser(user)
 				newUserCount += 1
+			self._indexUser(user)
+			self.changedUsers.add(user.name)
 
 		if newUserCount > 0:
 			print newUserCount, 'users inserted'
-		self.saveUsers()
 
-	# Insert new messages into posts database
-	# [old, ..., new]
-	def updatePosts(self, posts):
+	# Return new messages ordered [old, ..., new] with their dates converted, or [] if they're out of order
+	def _orderPosts(self, posts):
 		if not posts:
-			return
-		if utils.convertDate(posts[0]['date']) > utils.convertDate(posts[-1]['date']):
-			posts.reverse()
-		for i in range(len(posts)-1):
-			if utils.convertDate(posts[i]['date']) > utils.convertDate(posts[i+1]['date']):
-				print 'ERROR: database.updatePosts incoming posts not in order'
-				print '-', utils.convertDate(posts[i]['date']), utils.convertDate(posts[i+1]['date'])
-				return
-
-		newPostCount = 0
-		newUserCount = 0
+			return []
 
-		dateLookup = {}
+		# Dates are converted once, here
+		for post in posts:
+			post['date'] = utils.parseDate(post['date'])
 
-		for post in self.posts:
-			if post.date in dateLookup:
-				dateLookup[post.date].append(post)
-			else:
-				dateLookup[post.date] = [post]
+		dates = [post['date'] for post in posts]
+		if dates[0] > dates[-1]:
+			posts.reverse()
+			dates.reverse()
+		for i in range(len(dates)-1):
+			if dates[i] > dates[i+1]:
+				print 'ERROR: database.updatePosts incoming posts not in order'
+				print '-', utils.formatDate(dates[i]), utils.formatDate(dates[i+1])
+				return []
+		return posts
 
+	# Merge a batch of new messages into the posts in memory, returning the posts that weren't known
+	def _mergePosts(self, posts):
+		newPosts = []
 		for data in posts:
 			newPost = Post(data)
-			isNew = True
 
-			if newPost.date in dateLookup:
-				if newPost in dateLookup[newPost.date]:
-					isNew = False
-				dateLookup[newPost.date].append(newPost)
-			else:
-				dateLookup[newPost.date] = [newPost]
-			
-			if isNew:
+			if self.dedup.add(newPost):
 				if newPost.name not in self.users:
 					user = User()
 					user.name = newPost.name
-					self.users[user.name] = user
-					newUserCount += 1
+					self._addUser(user)
 				self.users[newPost.name].addIp(newPost.ip)
+				self.users[newPost.name].countPost(newPost.date)
+				self.aliases.add(newPost.name, newPost.ip)
+				self.changedUsers.add(newPost.name)
+
+				newPosts.append(newPost)
+
+		self.posts.add(newPosts)
+		return newPosts
+
+	# Store posts merged by _mergePosts, returning how many there were
+	def _storePosts(self, posts, compactLimit=None):
+		if posts:
+			self.appendPosts(posts, compactLimit)
+			self.dedup.append(posts)
+		return len(posts)
+
+	# Insert a new user
+	def _addUser(self, user):
+		self.users[user.name] = user
+		self.names.add(user.name)
+
+	# Add a user's name and ips to the alias index
+	def _indexUser(self, user):
+		self.aliases.add(user.name)
+		for ip in user.ip:
+			self.aliases.add(user.name, ip)
 
-				self.posts.append(newPost)
-				newPostCount += 1
-
-		if newPostCount > 0:
-			print newPostCount, 'posts inserted'
-			self.posts.sort()
-			self.savePosts()
-		if newUserCount > 0:
-			print newUserCount, 'users inserted'
-			self.saveUsers()
-
-
-	# Find all users related by name or ip
-	def getAlias(self, name):
-		if name not in self.users:
-			return []
-
-		checkedNames = []
-		checkedIps = []
-
-		def scanIp(ip):
-			if ip not in checkedIps:
-				checkedIps.append(ip)
-				for name in self.users:
-					user = self.users[name]
-					if ip in user.ip:
-						scanName(user.name)
-
-		def scanName(name):
-			if name not in checkedNames:
-				checkedNames.append(name)
-				for ip in self.users[name].ip:
-					scanIp(ip)
-
-		scanName(name)
-		checkedNames.remove(name)
-		return checkedNames
-
-	# Get number of posts by a user
-	def getPostCountByUser(self, name):
-		count = 0
-		for post in self.posts:
-			if name == post.name:
-				count += 1
-		return count
-
-	# Return username from fuzzy name search
-	def findUserByName(self, name):
-		if name in self.users:
-			return self.users[name]
-		for user in self.users:
-			if name.lower() == user.lower():
-				return self.users[user]
-		return None
+	# Identifies the users data an alias index was built from
+	def _aliasSignature(self):
+		return [len(self.users), sum(len(self.users[name].ip) for name in self.users)]
 
 
 # User is used to store user information.
@@ -209,11 +355,16 @@ class User:
 	def __init__(self, data=None):
 		self.name = None
 		self.roles = []
-		self.ip = []
+		self.ip = set()
 		self.lastUsed = None
 		self.registered = None
 		self.token = None
 
+		# Post counters, maintained by the database
+		self.postCount = 0
+		self.firstPost = None
+		self.lastPost = None
+
 		if data:
 			self.loadDict(data)
 
@@ -225,30 +376,36 @@ class User:
 		return {
 			'name': self.name,
 			'roles': self.roles,
-			'ip': self.ip,
-			'last used': self.lastUsed,
-			'registered': self.registered,
-			'token': self.token
+			'ip': sorted(self.ip),
+			'last used': utils.formatDate(self.lastUsed),
+			'registered': utils.formatDate(self.registered),
+			'token': self.token,
+			'posts': self.postCount,
+			'first post': utils.formatDate(self.firstPost),
+			'last post': utils.formatDate(self.lastPost)
 		}
 
 	# Unpack dict data to instance
 	def unpack(self, data):
-		self.name = data['name']
+		self.name = strings.get(data['name'])
 		self.roles = data['roles']
-		self.ip = data['ip']
-		self.lastUsed = data['last used']
-		self.registered = data['registered']
+		self.ip = set(strings.get(ip) for ip in data['ip'])
+		self.lastUsed = utils.parseDate(data['last used'])
+		self.registered = utils.parseDate(data['registered'])
 		self.token = data['token']
+		self.postCount = data.get('posts', 0)
+		self.firstPost = utils.parseDate(data.get('first post'))
+		self.lastPost = utils.parseDate(data.get('last post'))
 
 	# Load from admin users list
 	def loadDict(self, data):
-		self.name = data['name']
+		self.name = strings.get(data['name'])
 		for role in data['roles']:
 			self.roles.append(role)
 		if data['ip'] != '0.0.0.0':
-			self.ip.append(data['ip'])
-		self.lastUsed = utils.convertDate(data['last used'])
-		self.registered = utils.convertDate(data['registered'])
+			self.ip.add(strings.get(data['ip']))
+		self.lastUsed = utils.parseDate(data['last used'])
+		self.registered = utils.parseDate(data['registered'])
 		if data['token']:
 			self.token = data['token']
 
@@ -264,13 +421,30 @@ class User:
 
 	# Add ip to user
 	def addIp(self, ip):
-		if ip not in self.ip:
-			self.ip.append(ip)
+		self.ip.add(strings.get(ip))
+
+	# Count a post made by user
+	def countPost(self, date):
+		self.postCount += 1
+		if self.firstPost is None or date < self.firstPost:
+			self.firstPost = date
+		if self.lastPost is None or date > self.lastPost:
+			self.lastPost = date
+
+	# Clear post counters
+	def resetPostCount(self):
+		self.postCount = 0
+		self.firstPost = None
+		self.lastPost = None
 
 
 # Post is used to store one chat message.
 # A new Post requires packed data from the database or extracted from Cbox control panel.
-class Post:
+# Posts are slotted, and their name, ip and email are pooled, since the whole history is kept in memory.
+# Dates are kept as integer timestamps, and packed as readable date strings.
+class Post(object):
+	__slots__ = ['date', 'name', 'content', 'ip', 'email']
+
 	def __init__(self, data=None):
 		self.date = None
 		self.name = None
@@ -293,7 +467,7 @@ class Post:
 	# Pack instance data to string
 	def pack(self):
 		data = [
-			self.date,
+			utils.formatDate(self.date),
 			self.name,
 			self.content,
 			self.ip,
@@ -304,16 +478,16 @@ class Post:
 	# Unpack string to instance
 	def unpack(self, data):
 		data = data.split('\t')
-		self.date = data[0]
-		self.name = data[1]
+		self.date = utils.parseDate(data[0])
+		self.name = strings.get(data[1])
 		self.content = data[2]
-		self.ip = data[3]
-		self.email = data[4]
+		self.ip = strings.get(data[3])
+		self.email = strings.get(data[4])
 
 	# Load from admin posts list or archive
 	def loadDict(self, data):
-		self.date = utils.convertDate(data['date'])
-		self.name = data['name']
+		self.date = utils.parseDate(data['date'])
+		self.name = strings.get(data['name'])
 		self.content = data['content']
-		self.ip = data['ip']
-		self.email = data['email']
+		self.ip = strings.get(data['ip'])
+		self.email = strings.get(data['email'])
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import os, hashlib
+import utils
+
+
+# DedupIndex remembers a short content hash of every stored post,
+# so incoming posts can be checked for duplicates without looking at the stored ones.
+# Hashes are kept in a binary file of fixed-size records, appended to as posts are inserted.
+class DedupIndex:
+	hashSize = 8
+
+	def __init__(self, filePath):
+		self.filePath = filePath
+		self.hashes = set()
+		self.count = 0 # Records in file
+
+	# Return hash of a post's date, name, content, ip and email
+	def postHash(self, post):
+		return hashlib.md5(post.pack().encode('utf8')).digest()[:self.hashSize]
+
+	def __contains__(self, post):
+		return self.postHash(post) in self.hashes
+
+	# Remember post, returning False if it was already known
+	def add(self, post):
+		key = self.postHash(post)
+		if key in self.hashes:
+			return False
+		self.hashes.add(key)
+		return True
+
+
+	# Load hashes from file. Returns False if the file doesn't hold exactly postCount records.
+	def load(self, postCount):
+		self.hashes = set()
+		self.count = 0
+
+		if not os.path.exists(self.filePath):
+			return postCount == 0
+
+		with open(self.filePath, 'rb') as file:
+			data = file.read()
+		if len(data) != postCount * self.hashSize:
+			return False
+
+		self.hashes = set(data[i:i+self.hashSize] for i in range(0, len(data), self.hashSize))
+		self.count = postCount
+		return True
+
+	# Replace file with hashes of all posts
+	def rebuild(self, posts):
+		self.hashes = set()
+		for post in posts:
+			self.add(post)
+		utils.writeAtomic(self.filePath, ''.join(self.postHash(post) for post in posts))
+		self.count = len(posts)
+
+	# Append hashes of newly stored posts to file
+	def append(self, posts):
+		with open(self.filePath, 'ab') as file:
+			file.write(''.join(self.postHash(post) for post in posts))
+			file.flush()
+			os.fsync(file.fileno())
+		self.count += len(posts)
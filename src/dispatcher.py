@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import re, sre_parse, sre_constants
+
+
+# Return the literal text every match of a regex must start with, or '' if there is none.
+# Read from the parsed regex: its leading literals, up to the first alternation, class, group or repeat.
+def literalPrefix(expr):
+	toChar = unichr if isinstance(expr, unicode) else chr
+
+	prefix = []
+	for op, value in sre_parse.parse(expr):
+		if op != sre_constants.LITERAL:
+			break
+		prefix.append(toChar(value))
+	return ''.join(prefix)
+
+
+# Dispatcher routes chat messages to the methods whose regex matches them.
+# Regexes are filed in a trie under their literal prefix, e.g. "!alias " for "!alias (.*)",
+# so a message is only matched against regexes whose prefix it starts with.
+# Messages starting with a character no prefix starts with are rejected without running any regex.
+class Dispatcher:
+	FIRST = 'first' # Call only the first matching method
+	ALL = 'all' # Call every matching method
+
+	def __init__(self, mode=ALL):
+		if mode not in [self.FIRST, self.ALL]:
+			raise Exception('Unknown dispatch mode "{}"'.format(mode))
+		self.mode = mode
+
+		self.trie = {} # Char -> child node. The None key holds methods ending at a node.
+		self.unprefixed = [] # Methods without a literal prefix, tried on every message
+		self.count = 0
+
+	# Register func to be called for messages matching expr (case-insensitive)
+	def add(self, expr, func):
+		method = (self.count, re.compile(expr, re.IGNORECASE), func)
+		self.count += 1
+
+		prefix = literalPrefix(expr).lower()
+		if not prefix:
+			self.unprefixed.append(method)
+			return
+
+		node = self.trie
+		for char in prefix:
+			node = node.setdefault(char, {})
+		node.setdefault(None, []).append(method)
+
+	# Return (func, match) for methods matching text, in registration order
+	def match(self, text):
+		candidates = list(self.unprefixed)
+
+		node = self.trie
+		for char in text.lower():
+			node = node.get(char)
+			if node is None:
+				break
+			candidates.extend(node.get(None, ()))
+
+		if not candidates:
+			return []
+		candidates.sort()
+
+		matches = []
+		for order, regex, func in candidates:
+			match = regex.match(text)
+			if match:
+				matches.append((func, match))
+				if self.mode == self.FIRST:
+					break
+		return matches
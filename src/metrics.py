@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import time, threading, contextlib, collections
+
+
+latencyBounds = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120] # Seconds
+countBounds = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+# Counter is a number that only goes up, like requests sent.
+class Counter:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.value = 0
+
+	def inc(self, amount=1):
+		with self.lock:
+			self.value += amount
+
+	def snapshot(self):
+		return self.value
+
+
+# Gauge is a number that is set to its current value, like a queue length.
+class Gauge:
+	def __init__(self):
+		self.value = None
+
+	def set(self, value):
+		self.value = value
+
+	def snapshot(self):
+		return self.value
+
+
+# Histogram counts observed values in buckets with upper bounds, like request latencies.
+# Percentiles are estimated as the upper bound of the bucket they fall in.
+class Histogram:
+	def __init__(self, bounds=latencyBounds):
+		self.lock = threading.Lock()
+		self.bounds = bounds
+		self.buckets = [0] * (len(bounds) + 1) # The last bucket is above every bound
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def observe(self, value):
+		with self.lock:
+			i = 0
+			while i < len(self.bounds) and value > self.bounds[i]:
+				i += 1
+			self.buckets[i] += 1
+			self.count += 1
+			self.total += value
+			self.max = max(self.max, value)
+
+	def mean(self):
+		return self.total / self.count if self.count else 0.0
+
+	# Return the estimated value at fraction (0 to 1) of observed values
+	def percentile(self, fraction):
+		with self.lock:
+			rank = fraction * self.count
+			seen = 0
+			for i, count in enumerate(self.buckets):
+				seen += count
+				if seen >= rank and count:
+					return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+			return 0.0
+
+	def snapshot(self):
+		return collections.OrderedDict([
+			('count', self.count),
+			('mean', self.mean()),
+			('p50', self.percentile(0.5)),
+			('p90', self.percentile(0.9)),
+			('p99', self.percentile(0.99)),
+			('max', self.max),
+			('buckets', collections.OrderedDict(zip([str(bound) for bound in self.bounds] + ['+inf'], self.buckets)))
+		])
+
+
+# Registry holds the bot's metrics by name. Metrics are created on first use,
+# so code only has to name what it measures.
+class Registry:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.metrics = {} # Name -> metric
+		self.startTime = time.time()
+
+	def counter(self, name):
+		return self._get(name, Counter)
+
+	def gauge(self, name):
+		return self._get(name, Gauge)
+
+	def histogram(self, name, bounds=latencyBounds):
+		return self._get(name, lambda: Histogram(bounds))
+
+	# Time the body of a with statement, observed in seconds by the histogram name
+	@contextlib.contextmanager
+	def timer(self, name):
+		startTime = time.time()
+		try:
+			yield
+		finally:
+			self.histogram(name).observe(time.time() - startTime)
+
+	# Return the current value of every metric, by name
+	def snapshot(self):
+		with self.lock:
+			metrics = sorted(self.metrics.items())
+		return collections.OrderedDict(
+			[('time', int(time.time())), ('uptime', time.time() - self.startTime)] +
+			[(name, metric.snapshot()) for name, metric in metrics])
+
+
+	def _get(self, name, create):
+		with self.lock:
+			metric = self.metrics.get(name)
+			if metric is None:
+				metric = self.metrics[name] = create()
+		return metric
+
+
+registry = Registry() # Metrics of the running bot
@@ -0,0 +1,43 @@
+import sys
+
+import utils
+from storage import createStorage
+from database import User, Post
+
+
+backends = ['file', 'sqlite']
+
+if len(sys.argv) != 3 or sys.argv[1] not in backends or sys.argv[2] not in backends or sys.argv[1] == sys.argv[2]:
+	print 'python migrate.py <from-backend> <to-backend>'
+	print 'Backends:', ', '.join(backends)
+	exit()
+
+source = createStorage(sys.argv[1])
+target = createStorage(sys.argv[2])
+
+# Posts are only ever appended to the SQLite tables, so they must not hold any yet
+if sys.argv[2] == 'sqlite' and len(target.loadPosts(Post)):
+	print 'The sqlite database already has posts, not migrating'
+	exit()
+
+# Packs written before post counters were kept lack them, so they're normalised through User.
+# Missing counters are recounted the first time the migrated database loads.
+users = []
+for pack in source.loadUsers():
+	user = User()
+	user.unpack(pack)
+	users.append(user.pack())
+print 'Migrating {} users...'.format(len(users))
+target.saveUsers(users)
+
+posts = source.loadPosts(Post)
+print 'Migrating {} posts...'.format(len(posts))
+newest = posts.newest()
+highWater = utils.formatDate(newest.date) if newest else None
+# Posts are streamed in date order. SQLite only ever appends them.
+if sys.argv[2] == 'sqlite':
+	target.appendPosts(posts.packs(), highWater)
+else:
+	target.savePosts(posts.packs(), highWater)
+
+print 'Done. Set DB_BACKEND = "{}" in config.py to use it.'.format(sys.argv[2])
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import bisect, difflib, unicodedata
+
+
+# NameIndex maps normalized usernames back to the names they came from.
+# Names are lowercased and optionally Unicode normalized, kept sorted for prefix lookups
+# and split into trigrams so fuzzy lookups only compare names sharing some of the text.
+class NameIndex:
+	def __init__(self, normalization=None):
+		self.normalization = normalization # Unicode normal form, e.g. "NFKC"
+
+		self.names = {} # Key -> names
+		self.keys = [] # Sorted keys
+		self.grams = {} # Trigram -> keys
+
+	# Return lookup key for a name
+	def normalize(self, name):
+		name = unicode(name)
+		if self.normalization:
+			name = unicodedata.normalize(self.normalization, name)
+		return name.lower()
+
+	# Insert name, ignoring names already indexed
+	def add(self, name):
+		key = self.normalize(name)
+		if key in self.names:
+			if name not in self.names[key]:
+				self.names[key].append(name)
+			return
+
+		self.names[key] = [name]
+		bisect.insort(self.keys, key)
+		for gram in self._trigrams(key):
+			self.grams.setdefault(gram, set()).add(key)
+
+	# Return names equal to name, ignoring case
+	def find(self, name):
+		return list(self.names.get(self.normalize(name), []))
+
+	# Return up to limit names starting with prefix, ignoring case
+	def findByPrefix(self, prefix, limit=10):
+		prefix = self.normalize(prefix)
+		result = []
+
+		i = bisect.bisect_left(self.keys, prefix)
+		while i < len(self.keys) and self.keys[i].startswith(prefix) and len(result) < limit:
+			result.extend(self.names[self.keys[i]])
+			i += 1
+		return result[:limit]
+
+	# Return up to limit names similar to name, best match first
+	def suggest(self, name, limit=3, cutoff=0.6):
+		key = self.normalize(name)
+
+		# Only rank the keys sharing the most trigrams
+		shared = {}
+		for gram in self._trigrams(key):
+			for candidate in self.grams.get(gram, ()):
+				shared[candidate] = shared.get(candidate, 0) + 1
+		candidates = sorted(shared, key=shared.get, reverse=True)[:50]
+
+		matcher = difflib.SequenceMatcher()
+		matcher.set_seq2(key)
+		scored = []
+		for candidate in candidates:
+			matcher.set_seq1(candidate)
+			if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+				ratio = matcher.ratio()
+				if ratio >= cutoff:
+					scored.append((ratio, candidate))
+		scored.sort(reverse=True)
+
+		result = []
+		for ratio, candidate in scored:
+			result.extend(self.names[candidate])
+		return result[:limit]
+
+
+	# Split key into trigrams, padded so short names still produce some
+	def _trigrams(self, key):
+		key = u'  ' + key + u' '
+		return set(key[i:i+3] for i in range(len(key) - 2))
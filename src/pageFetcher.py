@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import threading, Queue
+
+
+# PageFetcher downloads control panel pages on a bounded pool of worker threads.
+# All workers share one transport, so they keep their connections open and send the logged-in cookies.
+# (multiprocessing.pool can't be used here, twill shadows the subprocess module it imports.)
+class PageFetcher:
+	def __init__(self, transport, workers):
+		self.transport = transport
+		self.workers = workers
+
+		self.jobs = Queue.Queue()
+		self.threads = []
+		for i in range(workers):
+			thread = threading.Thread(target=self._worker, name="fetch-{}".format(i))
+			thread.daemon = True
+			thread.start()
+			self.threads.append(thread)
+
+	# Replace session cookies with those of a logged-in cookie jar
+	def setCookies(self, cookieJar):
+		self.transport.setCookies(cookieJar)
+
+	# Return (raw html, charset from the response headers or None) of url
+	def fetch(self, url):
+		code, body, charset = self.transport.request(url)
+		if code < 200 or code >= 300:
+			raise Exception("Unable to fetch {} (HTTP {})".format(url, code))
+		return body, charset
+
+	# Return (raw html, charset) of all urls in the same order, fetched concurrently.
+	# Raises the first error if any page failed.
+	def fetchAll(self, urls):
+		results = Queue.Queue()
+		for i, url in enumerate(urls):
+			self.jobs.put((i, url, results))
+
+		pages = [None] * len(urls)
+		errors = []
+		for _ in urls:
+			i, page, error = results.get()
+			pages[i] = page
+			if error:
+				errors.append(error)
+
+		if errors:
+			raise errors[0]
+		return pages
+
+	# Stop the workers once they finish their current page.
+	# Their curl handles must be released before the interpreter shuts down.
+	def close(self, timeout=None):
+		for thread in self.threads:
+			self.jobs.put(None)
+		for thread in self.threads:
+			thread.join(timeout)
+
+	def _worker(self):
+		while True:
+			job = self.jobs.get()
+			if job is None:
+				return
+			i, url, results = job
+			try:
+				results.put((i, self.fetch(url), None))
+			except Exception as e:
+				results.put((i, None, e))
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import os, json, mmap, array
+import utils
+
+
+# MappedLines reads the lines of a memory-mapped file by index, decoding each line only when accessed.
+# offsets holds the byte offset of every line start, followed by the end of the last line.
+class MappedLines:
+	def __init__(self, data, offsets):
+		self.data = data # mmap of the file
+		self.offsets = offsets
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	def __getitem__(self, i):
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError(i)
+		return self.data[self.offsets[i]:self.offsets[i+1]].rstrip('\n').decode('utf8')
+
+	def __iter__(self):
+		for i in xrange(len(self)):
+			yield self[i]
+
+
+# PostLog stores packed posts as a compacted segment followed by an append-only log.
+# New posts are appended to the log, and compaction merges the log back into the segment.
+# The manifest records how many posts each file holds and the newest post date seen.
+# The segment is memory-mapped rather than read, with the line offsets kept in a sidecar index file.
+class PostLog:
+	indexSamples = 64 # Line starts checked when validating the index
+
+	def __init__(self, dbPath, segmentPath, logPath, manifestPath, indexPath, compactLimit):
+		self.segmentFile = dbPath + segmentPath
+		self.logFile = dbPath + logPath
+		self.manifestFile = dbPath + manifestPath
+		self.indexFile = dbPath + indexPath
+		self.compactLimit = compactLimit
+
+		self.segmentCount = 0
+		self.logCount = 0
+		self.highWater = None
+
+
+	# Load packed post lines. Returns (segment, log): the segment's lines are read lazily
+	# and ordered by date, the log's are read into a list in the order they were appended.
+	def load(self):
+		manifest = self._loadManifest()
+		segment = self._mapSegment()
+
+		# A compaction was interrupted after the new segment was written,
+		# so the log is already part of the segment.
+		if manifest and len(segment) != manifest['segment count']:
+			print 'Post log was merged by an interrupted compaction, finishing it'
+			self.segmentCount = len(segment)
+			self.logCount = 0
+			self.highWater = manifest['high water']
+			self._truncateLog()
+			self._saveManifest()
+			return segment, []
+
+		log = self._readLines(self.logFile, repair=True)
+
+		self.segmentCount = len(segment)
+		self.logCount = len(log)
+		self.highWater = manifest['high water'] if manifest else None
+		if not manifest:
+			dates = [line.split('\t', 1)[0] for lines in (segment, log) for line in lines]
+			self.highWater = max(dates or [None])
+			self._saveManifest()
+
+		return segment, log
+
+	# Append packed post lines to the log
+	def append(self, lines, highWater):
+		if not lines:
+			return
+
+		with open(self.logFile, 'a') as file:
+			file.writelines([line.encode('utf8') + '\n' for line in lines])
+			file.flush()
+			os.fsync(file.fileno())
+
+		self.logCount += len(lines)
+		self.highWater = max(self.highWater, highWater)
+		self._saveManifest()
+
+	# Whether the log, after appending count more lines, has grown enough to be merged into the segment.
+	# limit overrides the compaction limit the log was opened with.
+	def needsCompaction(self, count=0, limit=None):
+		return self.logCount + count >= (limit or self.compactLimit)
+
+	# Rewrite the segment with all lines, in date order, and empty the log.
+	# Lines are written as they are iterated, and the new segment replaces the old one atomically.
+	def compact(self, lines, highWater):
+		tmpPath = self.segmentFile + '.tmp'
+		offsets = array.array('L', [0])
+		with open(tmpPath, 'w') as file:
+			for line in lines:
+				line = line.encode('utf8') + '\n'
+				file.write(line)
+				offsets.append(offsets[-1] + len(line))
+			file.flush()
+			os.fsync(file.fileno())
+		os.rename(tmpPath, self.segmentFile)
+		self._saveIndex(offsets)
+
+		self.segmentCount = len(offsets) - 1
+		self.logCount = 0
+		self.highWater = max(self.highWater, highWater)
+		self._truncateLog()
+		self._saveManifest()
+
+
+	# Read lines from file. Repairing drops a trailing line cut short by a crash.
+	def _readLines(self, filePath, repair=False):
+		if not os.path.exists(filePath) or os.path.getsize(filePath) == 0:
+			return []
+
+		with open(filePath, 'r') as file:
+			data = file.read()
+
+		end = data.rfind('\n') + 1
+		if end < len(data):
+			if repair:
+				print 'WARNING: Dropping incomplete line at end of', filePath
+				with open(filePath, 'r+') as file:
+					file.truncate(end)
+				data = data[:end]
+			else:
+				data += '\n'
+
+		return data.decode('utf8').splitlines()
+
+	# Map the segment file, loading its line offsets from the index or rebuilding them
+	def _mapSegment(self):
+		if not os.path.exists(self.segmentFile) or os.path.getsize(self.segmentFile) == 0:
+			return []
+
+		with open(self.segmentFile, 'r') as file:
+			data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		offsets = self._loadIndex(data)
+		if offsets is None:
+			print 'Rebuilding post index...'
+			offsets = array.array('L', [0])
+			for line in iter(data.readline, ''):
+				offsets.append(offsets[-1] + len(line))
+			self._saveIndex(offsets)
+
+		return MappedLines(data, offsets)
+
+	# Return the line offsets of the segment mapped in data, or None if the index doesn't match it.
+	# The index must end where the segment does, and a sample of its line starts must follow a newline.
+	def _loadIndex(self, data):
+		if not os.path.exists(self.indexFile):
+			return None
+
+		offsets = array.array('L')
+		with open(self.indexFile, 'rb') as file:
+			offsets.fromstring(file.read())
+
+		if len(offsets) < 2 or offsets[0] != 0 or offsets[-1] != len(data):
+			return None
+		step = max(1, (len(offsets)-2) // self.indexSamples)
+		for i in range(1, len(offsets)-1, step):
+			if data[offsets[i]-1] != '\n':
+				return None
+		return offsets
+
+	def _saveIndex(self, offsets):
+		utils.writeAtomic(self.indexFile, offsets.tostring())
+
+	def _truncateLog(self):
+		with open(self.logFile, 'w') as file:
+			os.fsync(file.fileno())
+
+	def _loadManifest(self):
+		if not os.path.exists(self.manifestFile):
+			return None
+		with open(self.manifestFile, 'r') as file:
+			return json.loads(file.read())
+
+	def _saveManifest(self):
+		manifest = {
+			'segment count': self.segmentCount,
+			'log count': self.logCount,
+			'high water': self.highWater
+		}
+		utils.writeAtomic(self.manifestFile, json.dumps(manifest, indent=1))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import operator
+import utils
+
+
+postDate = operator.attrgetter('date')
+
+# Return the date of a packed post
+def packDate(pack):
+	return utils.parseDate(pack.split('\t', 1)[0])
+
+# Return the first index in items, ordered by date, whose date is not before date
+def bisectDate(items, date, getDate):
+	low, high = 0, len(items)
+	while low < high:
+		mid = (low + high) // 2
+		if getDate(items[mid]) < date:
+			low = mid + 1
+		else:
+			high = mid
+	return low
+
+
+# PostStore is the posts database in date order, built from what the storage loads.
+# The base holds the packed posts of the last compaction and is only decoded when posts are read,
+# so loading doesn't touch old posts. Posts added since are kept decoded in the sorted tail.
+# Both are ordered by date, so date ranges are found by bisecting them.
+class PostStore:
+	def __init__(self, base, tail, postClass):
+		self.base = base # Packed posts in date order
+		self.postClass = postClass
+
+		self.tail = [self._unpack(pack) for pack in tail] # Newer posts, in date order
+		self.tail.sort(key=postDate)
+
+	def __len__(self):
+		return len(self.base) + len(self.tail)
+
+	# Iterate over all posts in date order
+	def __iter__(self):
+		return self._merged(self._unpack, lambda post: post, 0, len(self.base), 0, len(self.tail))
+
+	# Iterate over all packed posts in date order
+	def packs(self):
+		return self._merged(lambda pack: pack, lambda post: post.pack(), 0, len(self.base), 0, len(self.tail))
+
+	# Return posts from start up to, but not including, end, in date order
+	def between(self, start, end):
+		baseStart = bisectDate(self.base, start, packDate)
+		baseEnd = bisectDate(self.base, end, packDate)
+		tailStart = bisectDate(self.tail, start, postDate)
+		tailEnd = bisectDate(self.tail, end, postDate)
+		return list(self._merged(self._unpack, lambda post: post, baseStart, baseEnd, tailStart, tailEnd))
+
+	# Add new posts. Batches arrive sorted, so they're merged into the tail in linear time.
+	def add(self, posts):
+		posts = sorted(posts, key=postDate)
+		if not self.tail or not posts or posts[0].date >= self.tail[-1].date:
+			self.tail.extend(posts)
+			return
+
+		tail = self.tail
+		merged = []
+		i = j = 0
+		while i < len(tail) and j < len(posts):
+			if posts[j].date < tail[i].date:
+				merged.append(posts[j])
+				j += 1
+			else:
+				merged.append(tail[i])
+				i += 1
+		merged.extend(tail[i:])
+		merged.extend(posts[j:])
+		self.tail = merged
+
+	# Return the newest post, or None if there are none
+	def newest(self):
+		last = self._unpack(self.base[-1]) if self.base else None
+		if self.tail and (last is None or self.tail[-1].date >= last.date):
+			return self.tail[-1]
+		return last
+
+
+	def _unpack(self, pack):
+		post = self.postClass()
+		post.unpack(pack)
+		return post
+
+	# Merge base[baseStart:baseEnd] and tail[tailStart:tailEnd] by date, base first on equal dates.
+	# Packed dates sort as strings, so base dates are compared unparsed, and not at all once the tail runs out.
+	def _merged(self, fromBase, fromTail, baseStart, baseEnd, tailStart, tailEnd):
+		tail = self.tail
+		j = tailStart
+		i = baseStart
+		while i < baseEnd and j < tailEnd:
+			tailDate = utils.formatDate(tail[j].date)
+			while i < baseEnd:
+				pack = self.base[i]
+				if tailDate < pack.split('\t', 1)[0]:
+					break
+				yield fromBase(pack)
+				i += 1
+			else:
+				break
+			yield fromTail(tail[j])
+			j += 1
+
+		for i in xrange(i, baseEnd):
+			yield fromBase(self.base[i])
+		for j in xrange(j, tailEnd):
+			yield fromTail(tail[j])
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import time, math, random
+import config
+
+
+# Return the poll scheduler with the given name
+def createScheduler(name):
+	if name == 'fixed':
+		return Scheduler()
+	if name == 'adaptive':
+		return AdaptiveScheduler(config.POLL_FLOOR, config.POLL_QUIET_CEILING, config.POLL_CEILING, config.POLL_IDLE_TIME,
+			config.POLL_HALF_LIFE, config.POLL_COMMAND_WINDOW)
+	raise Exception('Unknown poll scheduler "{}"'.format(name))
+
+
+# Schedulers decide how long to wait between chat polls.
+# The poll task reports every poll and command, then asks for the next delay.
+# Failed polls back off exponentially with jitter, up to config.POLL_ERROR_CEILING seconds.
+# This base scheduler keeps the original cadence: 15 seconds after 30 minutes without messages,
+# 5 seconds after 5 minutes without commands, otherwise 2 seconds. Subclasses override _delay.
+class Scheduler:
+	errorCeiling = config.POLL_ERROR_CEILING
+	jitter = config.POLL_JITTER # Random fraction added or removed from each delay
+
+	def __init__(self):
+		self.lastPollTime = time.time()
+		self.lastMessageTime = time.time()
+		self.lastCommandTime = time.time()
+		self.errorStreak = 0
+
+		self.stats = {
+			'polls': 0,
+			'empty polls': 0,
+			'errors': 0,
+			'messages': 0
+		}
+
+	# Record a poll returning count messages, or failing
+	def onPoll(self, count, error=False):
+		now = time.time()
+		self.stats['polls'] += 1
+		self.stats['messages'] += count
+
+		if error:
+			self.stats['errors'] += 1
+			self.errorStreak += 1
+		else:
+			self.errorStreak = 0
+			if count == 0:
+				self.stats['empty polls'] += 1
+			else:
+				self.lastMessageTime = now
+
+		self._update(count, now - self.lastPollTime)
+		self.lastPollTime = now
+
+	# Record a command being issued
+	def onCommand(self):
+		self.lastCommandTime = time.time()
+
+	# Return seconds to wait before the next poll
+	def nextDelay(self):
+		if self.errorStreak:
+			delay = min(self.errorCeiling, self._delay() * 2 ** self.errorStreak)
+		else:
+			delay = self._delay()
+		return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+	def _update(self, count, elapsed):
+		pass
+
+	def _delay(self):
+		# If no messages for 30 minutes, take it easy.
+		if time.time() - self.lastMessageTime > 30*60:
+			return 15
+		# If no issued commands for 5 minutes, bot not needed.
+		elif time.time() - self.lastCommandTime > 5*60:
+			return 5
+		# People are using the bot.
+		else:
+			return 2
+
+
+# AdaptiveScheduler polls about once per expected message, from a moving average of the message rate,
+# kept between floor and quietCeiling seconds. Only after idleTime seconds without messages does it
+# slow down to ceiling seconds, so a command in a quiet chat is answered as fast as with the fixed cadence.
+# Right after a command it polls at the floor, since whoever issued it is likely waiting for more responses.
+class AdaptiveScheduler(Scheduler):
+	def __init__(self, floor, quietCeiling, ceiling, idleTime, halfLife, commandWindow):
+		Scheduler.__init__(self)
+		self.floor = floor # Shortest delay in seconds
+		self.quietCeiling = quietCeiling # Longest delay in seconds, when messages are rare
+		self.ceiling = ceiling # Longest delay in seconds, when idle
+		self.idleTime = idleTime # Seconds without messages before the chat counts as idle
+		self.halfLife = halfLife # Seconds for old message rates to lose half their weight
+		self.commandWindow = commandWindow # Seconds to poll at the floor after a command
+
+		self.rate = 0.0 # Messages per second
+
+	def _update(self, count, elapsed):
+		if elapsed <= 0:
+			return
+		weight = 1 - math.exp(-elapsed * math.log(2) / self.halfLife)
+		self.rate += weight * (count / elapsed - self.rate)
+
+	def _delay(self):
+		if time.time() - self.lastCommandTime < self.commandWindow:
+			return self.floor
+		if time.time() - self.lastMessageTime > self.idleTime:
+			return self.ceiling
+		if self.rate <= 0:
+			return self.quietCeiling
+		return min(max(1 / self.rate, self.floor), self.quietCeiling)
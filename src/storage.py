@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import os, json, sqlite3, threading, collections, heapq
+import utils
+import config
+from postLog import PostLog
+from dedupIndex import DedupIndex
+from postStore import PostStore, postDate
+
+
+# Return the storage backend with the given name
+def createStorage(backend):
+	if backend == 'file':
+		return FileStorage(config.DB_PATH)
+	if backend == 'sqlite':
+		return SqliteStorage(config.DB_PATH)
+	raise Exception('Unknown database backend "{}"'.format(backend))
+
+
+# Return the pack of a user from the users log applied over the stored one.
+# After an interrupted compaction the log can be older than users.json, so ips, last use and post counters never go back.
+def mergeUserPacks(stored, logged):
+	if stored is None:
+		return logged
+
+	pack = dict(logged)
+	pack['ip'] = sorted(set(stored['ip']) | set(logged['ip']))
+	pack['last used'] = max(stored['last used'], logged['last used'])
+	if stored.get('posts', 0) > logged.get('posts', 0):
+		for key in ['posts', 'first post', 'last post']:
+			pack[key] = stored.get(key)
+	return pack
+
+
+# Storage backends persist packed users (dicts from User.pack) and packed posts (strings from Post.pack).
+# Users are saved all at once, or only the changed ones are appended.
+# Posts load as a post store of postClass instances: the posts in date order, read as they're used,
+# with between(), newest(), add() and iteration. Stored posts are checked for duplicates by a dedup index.
+# FileStorage keeps users in users.json with an append-only log of changed users,
+# and posts in posts.txt with an append-only post log.
+class FileStorage:
+	usersPath = config.DB_USERS_PATH
+	usersLogPath = config.DB_USERS_LOG_PATH
+	usersCompactLimit = config.DB_USERS_COMPACT_LIMIT
+	postsPath = config.DB_POSTS_PATH
+	postsLogPath = config.DB_POSTS_LOG_PATH
+	postsManifestPath = config.DB_POSTS_MANIFEST_PATH
+	postsIndexPath = config.DB_POSTS_INDEX_PATH
+	postsHashesPath = config.DB_POSTS_HASHES_PATH
+	postsCompactLimit = config.DB_POSTS_COMPACT_LIMIT
+
+	def __init__(self, dbPath):
+		self.dbPath = dbPath
+		self.postLog = PostLog(dbPath, self.postsPath, self.postsLogPath, self.postsManifestPath, self.postsIndexPath, self.postsCompactLimit)
+		self.usersLogCount = 0
+
+		if not os.path.exists(self.dbPath):
+			os.makedirs(self.dbPath)
+
+	def loadUsers(self):
+		packs = collections.OrderedDict()
+		filePath = self.dbPath + self.usersPath
+		if os.path.exists(filePath) and os.path.getsize(filePath) > 0:
+			with open(filePath, 'r') as file:
+				for pack in json.loads(file.read()):
+					packs[pack['name']] = pack
+
+		logged = utils.readJsonLines(self.dbPath + self.usersLogPath)
+		for pack in logged:
+			packs[pack['name']] = mergeUserPacks(packs.get(pack['name']), pack)
+		self.usersLogCount = len(logged)
+		return packs.values()
+
+	# Replace all users, emptying the users log
+	def saveUsers(self, packs):
+		package = json.dumps(packs, ensure_ascii=False, indent=1)
+		utils.writeAtomic(self.dbPath + self.usersPath, package.encode('utf-8'))
+		utils.truncate(self.dbPath + self.usersLogPath)
+		self.usersLogCount = 0
+
+	# Append changed users to the users log
+	def appendUsers(self, packs):
+		utils.appendJsonLines(self.dbPath + self.usersLogPath, packs)
+		self.usersLogCount += len(packs)
+
+	# Whether saveUsers should be called instead of appending count more users
+	def needsUserCompaction(self, count=0):
+		return self.usersLogCount + count >= self.usersCompactLimit
+
+	def loadPosts(self, postClass):
+		base, tail = self.postLog.load()
+		return PostStore(base, tail, postClass)
+
+	# Return the index used to check posts for duplicates, a hash of every stored post
+	def createDedup(self):
+		return DedupIndex(self.dbPath + self.postsHashesPath)
+
+	# Replace all posts, compacting the post log
+	def savePosts(self, packs, highWater):
+		self.postLog.compact(packs, highWater)
+
+	def appendPosts(self, packs, highWater):
+		self.postLog.append(packs, highWater)
+
+	# Whether savePosts should be called instead of appending count more posts, with an optional log limit
+	def needsCompaction(self, count=0, limit=None):
+		return self.postLog.needsCompaction(count, limit)
+
+
+# SqliteStorage keeps users, posts and the user-ip relation in indexed tables of one database file.
+# Writes are batched into a single transaction per call. Posts are only ever appended,
+# and are read by indexed queries as they're used rather than loaded.
+# The connection is shared by the sync task and command threads, so it's used under a lock.
+class SqliteStorage:
+	sqlitePath = config.DB_SQLITE_PATH
+	fetchSize = 1000 # Posts read per query when iterating over all posts
+
+	schema = '''
+		CREATE TABLE IF NOT EXISTS users (
+			name TEXT PRIMARY KEY,
+			roles TEXT,
+			last_used TEXT,
+			registered TEXT,
+			token TEXT,
+			posts INTEGER,
+			first_post TEXT,
+			last_post TEXT
+		);
+		CREATE TABLE IF NOT EXISTS user_ips (
+			name TEXT,
+			ip TEXT,
+			PRIMARY KEY (name, ip)
+		);
+		CREATE INDEX IF NOT EXISTS user_ips_ip ON user_ips (ip);
+		CREATE TABLE IF NOT EXISTS posts (
+			id INTEGER PRIMARY KEY,
+			date TEXT,
+			name TEXT,
+			content TEXT,
+			ip TEXT,
+			email TEXT
+		);
+		CREATE INDEX IF NOT EXISTS posts_date ON posts (date);
+		CREATE INDEX IF NOT EXISTS posts_name ON posts (name);
+	'''
+
+	def __init__(self, dbPath):
+		if not os.path.exists(dbPath):
+			os.makedirs(dbPath)
+
+		self.lock = threading.RLock()
+		self.conn = sqlite3.connect(dbPath + self.sqlitePath, check_same_thread=False)
+		self.conn.executescript(self.schema)
+		self.posts = None # Post store of the last loadPosts
+
+	def loadUsers(self):
+		with self.lock:
+			ipRows = self.conn.execute('SELECT name, ip FROM user_ips ORDER BY rowid').fetchall()
+			userRows = self.conn.execute('SELECT name, roles, last_used, registered, token, posts, first_post, last_post FROM users').fetchall()
+
+		ips = {}
+		for name, ip in ipRows:
+			ips.setdefault(name, []).append(ip)
+
+		packs = []
+		for row in userRows:
+			packs.append({
+				'name': row[0],
+				'roles': json.loads(row[1]),
+				'ip': ips.get(row[0], []),
+				'last used': row[2],
+				'registered': row[3],
+				'token': row[4],
+				'posts': row[5],
+				'first post': row[6],
+				'last post': row[7]
+			})
+		return packs
+
+	# Insert or update users. Ips are only ever added.
+	def saveUsers(self, packs):
+		with self.lock, self.conn:
+			self.conn.executemany('INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [(
+				pack['name'],
+				json.dumps(pack['roles']),
+				pack['last used'],
+				pack['registered'],
+				pack['token'],
+				pack['posts'],
+				pack['first post'],
+				pack['last post']
+			) for pack in packs])
+			self.conn.executemany('INSERT OR IGNORE INTO user_ips VALUES (?, ?)',
+				[(pack['name'], ip) for pack in packs for ip in pack['ip']])
+
+	# Changed users are saved in place
+	def appendUsers(self, packs):
+		self.saveUsers(packs)
+
+	def needsUserCompaction(self, count=0):
+		return False
+
+	def loadPosts(self, postClass):
+		self.posts = SqlitePostStore(self, postClass)
+		return self.posts
+
+	# Return the index used to check posts for duplicates, which queries the posts table
+	def createDedup(self):
+		return SqliteDedup(self)
+
+	# Posts are stored as they're appended, the table is never rewritten
+	def savePosts(self, packs, highWater):
+		pass
+
+	# Insert posts, which leave the post store's tail once they're in the table
+	def appendPosts(self, packs, highWater):
+		with self.lock:
+			with self.conn:
+				self.conn.executemany('INSERT INTO posts (date, name, content, ip, email) VALUES (?, ?, ?, ?, ?)',
+					(pack.split('\t') for pack in packs))
+			if self.posts is not None:
+				self.posts.tail = []
+
+	def needsCompaction(self, count=0, limit=None):
+		return False
+
+	# Whether a packed post is in the posts table.
+	# Looked up by date, which few posts share, rather than by name, which many do.
+	def hasPost(self, pack):
+		with self.lock:
+			return self.conn.execute('SELECT 1 FROM posts INDEXED BY posts_date WHERE date = ? AND name = ? AND content = ? AND ip = ? AND email = ? LIMIT 1',
+				pack.split('\t')).fetchone() is not None
+
+	def countPosts(self):
+		with self.lock:
+			return self.conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+
+	# Return packed posts from a query on the posts table
+	def selectPosts(self, where='', args=(), order='date, id', limit=None):
+		return [u'\t'.join(row[1:]) for row in self._selectRows(where, args, order, limit)]
+
+	# Iterate over all packed posts in date order, a query at a time,
+	# so commits in between don't reset a long-running cursor
+	def iterPosts(self):
+		rows = self._selectRows(limit=self.fetchSize)
+		while rows:
+			for row in rows:
+				yield u'\t'.join(row[1:])
+			lastId, date = rows[-1][:2]
+			rows = self._selectRows('WHERE date > ? OR (date = ? AND id > ?)', (date, date, lastId), limit=self.fetchSize)
+
+
+	def _selectRows(self, where='', args=(), order='date, id', limit=None):
+		query = 'SELECT id, date, name, content, ip, email FROM posts {} ORDER BY {}'.format(where, order)
+		if limit:
+			query += ' LIMIT {}'.format(limit)
+		with self.lock:
+			return self.conn.execute(query, args).fetchall()
+
+
+# Iterate over posts from two iterables in date order, first before second on equal dates
+def mergeByDate(first, second):
+	first = ((post.date, 0, post) for post in first)
+	second = ((post.date, 1, post) for post in second)
+	return (post for date, source, post in heapq.merge(first, second))
+
+
+# SqlitePostStore is the posts database of SqliteStorage, with the same interface as PostStore.
+# Nothing is loaded up front: date ranges are indexed queries, and the post count and the newest post are kept.
+# Posts added since they were last appended to the table are kept decoded in the tail.
+class SqlitePostStore:
+	def __init__(self, storage, postClass):
+		self.storage = storage
+		self.postClass = postClass
+		self.tail = [] # Added posts not yet in the table, in date order
+
+		self.count = storage.countPosts()
+		last = storage.selectPosts(order='date DESC, id DESC', limit=1)
+		self.last = self._unpack(last[0]) if last else None
+
+	def __len__(self):
+		return self.count
+
+	# Iterate over all posts in date order
+	def __iter__(self):
+		posts = (self._unpack(pack) for pack in self.storage.iterPosts())
+		tail = list(self.tail)
+		return mergeByDate(posts, tail) if tail else posts
+
+	# Iterate over all packed posts in date order
+	def packs(self):
+		if not self.tail:
+			return self.storage.iterPosts()
+		return (post.pack() for post in self)
+
+	# Return posts from start up to, but not including, end, in date order
+	def between(self, start, end):
+		with self.storage.lock:
+			packs = self.storage.selectPosts('WHERE date >= ? AND date < ?', (utils.formatDate(start), utils.formatDate(end)))
+			tail = [post for post in self.tail if start <= post.date < end]
+		posts = [self._unpack(pack) for pack in packs]
+		return list(mergeByDate(posts, tail)) if tail else posts
+
+	# Add new posts, to be appended to the table by SqliteStorage.appendPosts
+	def add(self, posts):
+		if not posts:
+			return
+		with self.storage.lock:
+			self.tail = sorted(self.tail + posts, key=postDate)
+		self.count += len(posts)
+		if self.last is None or self.tail[-1].date >= self.last.date:
+			self.last = self.tail[-1]
+
+	# Return the newest post, or None if there are none
+	def newest(self):
+		return self.last
+
+
+	def _unpack(self, pack):
+		post = self.postClass()
+		post.unpack(pack)
+		return post
+
+
+# SqliteDedup checks posts for duplicates with an indexed query on the posts table, so no hashes are kept.
+# Posts added since the last append aren't in the table yet, so they're remembered until then.
+class SqliteDedup:
+	def __init__(self, storage):
+		self.storage = storage
+		self.pending = set() # Packs of added posts not yet appended
+
+	def __contains__(self, post):
+		pack = post.pack()
+		return pack in self.pending or self.storage.hasPost(pack)
+
+	# Remember post, returning False if it was already known
+	def add(self, post):
+		pack = post.pack()
+		if pack in self.pending or self.storage.hasPost(pack):
+			return False
+		self.pending.add(pack)
+		return True
+
+	# The posts table is the index, so there's nothing to load or rebuild
+	def load(self, postCount):
+		return True
+
+	def rebuild(self, posts):
+		pass
+
+	# Appended posts are in the posts table now
+	def append(self, posts):
+		self.pending = set()
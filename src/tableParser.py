@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import io, re, codecs
+from lxml import etree
+
+
+# Return all text inside an element
+def text(element):
+	return unicode(''.join(element.itertext()))
+
+def strippedText(element):
+	return text(element).strip()
+
+
+# Schema describes the rows of a control panel list: which cell each field is read from, and how.
+# Every table row except the first (the header) is one record.
+class Schema:
+	def __init__(self, columns, emptyText=None):
+		self.columns = columns # List of (key, cell index, extractor taking the cell element)
+		self.emptyText = emptyText # First cell text of the row shown when the list is empty
+		self.width = max(index for key, index, extract in columns) + 1
+
+
+# Users: "<td>[Role] [Role] Name</td>" with each role in its own element
+def userName(td):
+	children = list(td)
+	name = children[-1].tail if children else td.text
+	return unicode(name or '').strip()
+
+def userRoles(td):
+	return [text(child)[1:-1] for child in td]
+
+USERS = Schema([
+	("name", 1, userName),
+	("roles", 1, userRoles),
+	("token", 2, text),
+	("registered", 3, strippedText),
+	("last used", 4, strippedText),
+	("ip", 5, strippedText),
+])
+
+# Posts: "<td><b>Name</b> email <span>Content</span></td>", then "<td>Date<br>\nIp</td>"
+def postName(td):
+	return text(td[0])
+
+def postEmail(td):
+	return unicode(td[0].tail or '').strip()
+
+def postContent(td):
+	return text(td[1])
+
+def postDate(td):
+	return text(td).splitlines()[0]
+
+def postIp(td):
+	return text(td).splitlines()[1]
+
+POSTS = Schema([
+	("name", 1, postName),
+	("email", 1, postEmail),
+	("content", 1, postContent),
+	("date", 2, postDate),
+	("ip", 2, postIp),
+])
+
+BANS = Schema([
+	("name", 1, strippedText),
+	("reason", 2, strippedText),
+	("ip", 3, strippedText),
+	("date", 4, strippedText),
+	("expiry", 5, strippedText),
+], emptyText="No bans found")
+
+
+# Return the number of pages from the page list, e.g. "Page: 1 2 3 ... 12"
+def parsePageCount(pageStr):
+	digit = pageStr.strip().split()[-1]
+	if '[' in digit or '-' in digit:
+		return 1
+	return int(digit)
+
+metaCharset = re.compile(r'<meta[^>]+charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Return the encoding of a page: the charset of the response headers, else the one declared
+# in the page's head, else utf-8
+def pageEncoding(data, charset=None):
+	if not charset:
+		match = metaCharset.search(data, 0, 4096)
+		charset = match.group(1) if match else 'utf-8'
+	try:
+		return codecs.lookup(charset).name
+	except LookupError:
+		return 'utf-8'
+
+# Return (records, page count) from the raw html of a control panel list page,
+# decoded with charset if the response gave one.
+# The page is parsed as a stream: each row is read into a dict as soon as it ends, then dropped,
+# so the document tree never holds more than one row.
+# The page count is read from the page list, the first right-aligned element outside the table.
+def parseTable(data, schema, charset=None):
+	rows = []
+	pager = None
+	pageCount = None
+	tableDepth = 0
+	header = True
+	empty = False
+
+	events = etree.iterparse(io.BytesIO(data), events=('start', 'end'), html=True,
+		encoding=pageEncoding(data, charset), remove_comments=True)
+	for event, element in events:
+		if event == 'start':
+			if element.tag == 'table':
+				tableDepth += 1
+			elif pager is None and not tableDepth and element.get('align') == 'right':
+				pager = element
+			continue
+
+		if element.tag == 'table':
+			tableDepth -= 1
+		if element is pager:
+			pageCount = parsePageCount(text(element))
+		if element.tag != 'tr':
+			continue
+
+		if header:
+			header = False
+		elif not empty:
+			tds = element.findall('td')
+			if schema.emptyText and schema.emptyText in text(tds[0]):
+				empty = True
+			elif len(tds) < schema.width:
+				raise Exception("Malformed table row: {}".format(etree.tostring(element)))
+			else:
+				rows.append({key: extract(tds[index]) for key, index, extract in schema.columns})
+
+		# Free the row, and the rows before it
+		element.clear()
+		while element.getprevious() is not None:
+			del element.getparent()[0]
+
+	if pageCount is None:
+		raise Exception("Page count not found")
+	return rows, pageCount
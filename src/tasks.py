@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import threading, traceback, time
+
+
+# Task runs a step function over and over on its own thread until cancelled.
+# The step returns how many seconds to wait before it runs again.
+# Cancelling wakes the task from its wait, so it stops as soon as the current step returns.
+class Task(threading.Thread):
+	errorDelay = 5 # Seconds to wait after a step raised
+
+	def __init__(self, name, step):
+		threading.Thread.__init__(self, name=name)
+		self.daemon = True
+		self.step = step
+		self.cancelled = threading.Event()
+
+	def run(self):
+		while not self.cancelled.is_set():
+			try:
+				delay = self.step()
+			except Exception:
+				print 'ERROR: Task "{}" failed'.format(self.name)
+				traceback.print_exc()
+				delay = self.errorDelay
+
+			if delay:
+				self.cancelled.wait(delay)
+
+	def cancel(self):
+		self.cancelled.set()
+
+
+# TaskGroup starts and stops a set of tasks together.
+class TaskGroup:
+	def __init__(self):
+		self.tasks = []
+
+	# Add a task running step, started with the group
+	def add(self, name, step):
+		task = Task(name, step)
+		self.tasks.append(task)
+		return task
+
+	def start(self):
+		for task in self.tasks:
+			task.start()
+
+	# Whether every task is still running
+	def isAlive(self):
+		return all(task.is_alive() for task in self.tasks)
+
+	# Cancel all tasks and wait up to timeout seconds for them to finish.
+	# Returns names of tasks still running.
+	def stop(self, timeout=None):
+		for task in self.tasks:
+			task.cancel()
+
+		deadline = time.time() + timeout if timeout is not None else None
+		for task in self.tasks:
+			task.join(None if deadline is None else max(deadline - time.time(), 0))
+		return [task.name for task in self.tasks if task.is_alive()]
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Måns Gezelius (Golen)
+# All rights reserved.
+
+import io, re, time, threading, pycurl
+
+
+# Transport sends HTTP requests over persistent curl handles, one per thread,
+# so repeated requests to the same host reuse the open connection instead of reconnecting.
+# DNS lookups are cached and shared between all handles of a transport.
+class Transport:
+	unsentErrors = [pycurl.E_COULDNT_RESOLVE_HOST, pycurl.E_COULDNT_CONNECT] # Errors raised before a request is sent
+	charsetPattern = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+	def __init__(self, timeout, connectTimeout, retries, backoff, dnsCacheTimeout):
+		self.timeout = timeout # Seconds per request
+		self.connectTimeout = connectTimeout # Seconds to connect
+		self.retries = retries # Extra attempts after a connection error or server error
+		self.backoff = backoff # Seconds before the first retry, doubled for each retry
+		self.dnsCacheTimeout = dnsCacheTimeout # Seconds to cache DNS lookups
+
+		self.cookies = None
+
+		self.share = pycurl.CurlShare()
+		self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+		self.local = threading.local()
+
+		self.lock = threading.Lock()
+		self.stats = {
+			'requests': 0, # Completed requests
+			'reused': 0, # Requests sent on an already open connection
+			'retries': 0,
+			'errors': 0, # Requests that failed after all retries
+			'time': 0.0, # Total seconds spent on completed requests
+			'max time': 0.0
+		}
+
+	# Send cookies from a cookie jar with every request
+	def setCookies(self, cookieJar):
+		self.cookies = '; '.join('{}={}'.format(cookie.name, cookie.value) for cookie in cookieJar)
+
+	# Send GET request. Returns (http code, response body).
+	def get(self, url):
+		return self.request(url)[:2]
+
+	# Send POST request with url encoded fields. Returns (http code, response body).
+	def post(self, url, fields):
+		return self.request(url, fields)[:2]
+
+	# Send request, retrying with backoff on connection errors and server errors.
+	# A POST may have been acted on even if its response never came, so it's only retried if it never reached the server.
+	# Returns (http code, response body, charset of the Content-Type header or None).
+	def request(self, url, fields=None):
+		isPost = fields is not None
+		attempt = 0
+		while True:
+			try:
+				code, body, charset = self._perform(url, fields)
+				if code < 500 or isPost or attempt >= self.retries:
+					return code, body, charset
+			except pycurl.error as e:
+				if attempt >= self.retries or (isPost and e.args[0] not in self.unsentErrors):
+					self._count('errors')
+					raise
+
+			attempt += 1
+			self._count('retries')
+			time.sleep(self.backoff * 2 ** (attempt-1))
+
+	# Return a copy of the counters, with average latency and connection reuse ratio
+	def getStats(self):
+		with self.lock:
+			stats = dict(self.stats)
+		count = max(stats['requests'], 1)
+		stats['avg time'] = stats['time'] / count
+		stats['reuse ratio'] = float(stats['reused']) / count
+		return stats
+
+
+	# Return this thread's curl handle, creating it on first use
+	def _handle(self):
+		curl = getattr(self.local, 'curl', None)
+		if curl is None:
+			curl = pycurl.Curl()
+			curl.setopt(pycurl.SHARE, self.share)
+			curl.setopt(pycurl.NOSIGNAL, 1)
+			curl.setopt(pycurl.TCP_KEEPALIVE, 1)
+			curl.setopt(pycurl.DNS_CACHE_TIMEOUT, self.dnsCacheTimeout)
+			curl.setopt(pycurl.CONNECTTIMEOUT, self.connectTimeout)
+			curl.setopt(pycurl.TIMEOUT, self.timeout)
+			self.local.curl = curl
+		return curl
+
+	def _perform(self, url, fields):
+		curl = self._handle()
+		buf = io.BytesIO()
+
+		try:
+			curl.setopt(pycurl.URL, url)
+			curl.setopt(pycurl.WRITEFUNCTION, buf.write)
+			if fields is None:
+				curl.setopt(pycurl.HTTPGET, 1)
+			else:
+				curl.setopt(pycurl.POSTFIELDS, fields)
+			if self.cookies:
+				curl.setopt(pycurl.COOKIE, self.cookies)
+
+			curl.perform()
+
+			code = curl.getinfo(pycurl.HTTP_CODE)
+			contentType = curl.getinfo(pycurl.CONTENT_TYPE)
+			match = self.charsetPattern.search(contentType or '')
+			elapsed = curl.getinfo(pycurl.TOTAL_TIME)
+			reused = curl.getinfo(pycurl.NUM_CONNECTS) == 0
+
+			with self.lock:
+				self.stats['requests'] += 1
+				self.stats['reused'] += reused
+				self.stats['time'] += elapsed
+				self.stats['max time'] = max(self.stats['max time'], elapsed)
+
+			return code, buf.getvalue(), match.group(1) if match else None
+		finally:
+			buf.close()
+
+	def _count(self, key):
+		with self.lock:
+			self.stats[key] += 1
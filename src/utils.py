@@ -1,4 +1,4 @@
-import re
+import re, os, json, threading, contextlib, datetime
 
 isDate = re.compile("^\d{4}-\d{2}-\d{2}.*$")
 
@@ -23,6 +23,153 @@ def convertDate(date):
 	return '20%02d-%02d-%02d' % (y, m, d)
 
 
+dayStarts = {} # Day string -> timestamp of its midnight
+dayNames = {} # Day number since epoch -> "YYYY-MM-DD"
+dayCacheLimit = 100000 # Days cached before the caches are cleared, as chat commands can ask for any day
+epochDay = datetime.date(1970, 1, 1).toordinal()
+
+# Converts "DD month YY [HH:MM[:SS]]" or "YYYY-MM-DD [HH:MM[:SS]]" to integer seconds since epoch.
+# Dates are taken as UTC. Timestamps are returned as they are.
+# Raises ValueError for dates and times that don't exist, like 2018-02-31 or 24:00.
+def parseDate(date):
+	if date in [None, 'never']:
+		return None
+	if isinstance(date, (int, long)):
+		return date
+
+	if date[4:5] == '-':
+		day, _, t = date.partition(' ')
+	else:
+		arr = date.split()
+		day, t = ' '.join(arr[:3]), ''.join(arr[3:])
+
+	start = dayStarts.get(day)
+	if start is None:
+		if day[4:5] == '-':
+			y,m,d = map(int, day.split('-'))
+		else:
+			d,m,y = day.split()
+			d,y,m = int(d), 2000 + int(y), months.index(m) + 1
+		start = (datetime.date(y, m, d).toordinal() - epochDay) * 86400
+		if len(dayStarts) >= dayCacheLimit:
+			dayStarts.clear()
+		dayStarts[day] = start
+
+	if not t:
+		return start
+	t = map(int, t.split(':'))
+	if not 2 <= len(t) <= 3 or not 0 <= t[0] < 24 or not all(0 <= n < 60 for n in t[1:]):
+		raise ValueError('Invalid time: {}'.format(date))
+	return start + t[0]*3600 + t[1]*60 + (t[2] if len(t) > 2 else 0)
+
+# Converts a timestamp to "YYYY-MM-DD HH:MM:SS", the format dates are stored in
+def formatDate(timestamp):
+	if timestamp is None:
+		return None
+
+	day, seconds = divmod(timestamp, 86400)
+	name = dayNames.get(day)
+	if name is None:
+		name = datetime.date.fromordinal(epochDay + day).isoformat()
+		if len(dayNames) >= dayCacheLimit:
+			dayNames.clear()
+		dayNames[day] = name
+	return '%s %02d:%02d:%02d' % (name, seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+# Write data to path atomically, so a crash never leaves a half-written file
+def writeAtomic(path, data):
+	tmpPath = path + '.tmp'
+	with open(tmpPath, 'w') as file:
+		file.write(data)
+		file.flush()
+		os.fsync(file.fileno())
+	os.rename(tmpPath, path)
+
+# Append values to a log file, one JSON value per line
+def appendJsonLines(path, values):
+	if not values:
+		return
+	with open(path, 'a') as file:
+		file.writelines([json.dumps(value, ensure_ascii=False).encode('utf-8') + '\n' for value in values])
+		file.flush()
+		os.fsync(file.fileno())
+
+# Return the values of a log file written by appendJsonLines.
+# A last line cut short by a crash is dropped from the file.
+def readJsonLines(path):
+	if not os.path.exists(path):
+		return []
+	with open(path, 'r') as file:
+		data = file.read()
+
+	end = data.rfind('\n') + 1
+	if end < len(data):
+		print 'WARNING: Dropping incomplete line at end of', path
+		with open(path, 'r+') as file:
+			file.truncate(end)
+		data = data[:end]
+
+	return [json.loads(line.decode('utf-8')) for line in data.splitlines()]
+
+# Empty a log file
+def truncate(path):
+	with open(path, 'w') as file:
+		os.fsync(file.fileno())
+
+
+# StringPool keeps one copy of each distinct string, like intern() but for unicode strings too.
+# Post fields repeat a lot (names, ips), so sharing them saves most of their memory.
+class StringPool:
+	def __init__(self):
+		self.strings = {}
+
+	# Return the pooled copy of string
+	def get(self, string):
+		return self.strings.setdefault(string, string)
+
+	def __len__(self):
+		return len(self.strings)
+
+
+# Lock shared by any number of readers, or held by one writer.
+# Waiting writers go first, so a steady stream of readers can't starve them.
+class ReadWriteLock:
+	def __init__(self):
+		self.cond = threading.Condition(threading.Lock())
+		self.readers = 0
+		self.writer = False
+		self.waitingWriters = 0
+
+	@contextlib.contextmanager
+	def reading(self):
+		with self.cond:
+			while self.writer or self.waitingWriters:
+				self.cond.wait()
+			self.readers += 1
+		try:
+			yield
+		finally:
+			with self.cond:
+				self.readers -= 1
+				self.cond.notify_all()
+
+	@contextlib.contextmanager
+	def writing(self):
+		with self.cond:
+			self.waitingWriters += 1
+			while self.writer or self.readers:
+				self.cond.wait()
+			self.waitingWriters -= 1
+			self.writer = True
+		try:
+			yield
+		finally:
+			with self.cond:
+				self.writer = False
+				self.cond.notify_all()
+
+
 # Return bold text
 def bold(text):
 	return "[b]%s[/b]" % (text)